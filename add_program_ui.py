@@ -2,82 +2,69 @@
 Script to add Program Name controls to index.html
 """
 
-# Read the file
-with open('templates/index.html', 'r', encoding='utf-8') as f:
-    content = f.read()
-
-# HTML to insert
-program_html = '''
-                <!-- Program Info -->
-                <div class="control-section">
-                    <div class="section-title">📺 Program Info</div>
-                    <div style="margin-bottom: 15px;">
-                        <div style="font-size: 11px; color: #6c757d; margin-bottom: 8px;">
-                            Program Name (Top-Right Overlay)
-                        </div>
-                        <div style="display: flex; gap: 8px;">
-                            <input type="text" id="programNameInput" placeholder="Enter program name..." 
-                                   style="flex: 1; padding: 8px; background: rgba(0,0,0,0.3); border: 1px solid rgba(255,255,255,0.1); border-radius: 6px; color: #fff; font-size: 12px;">
-                            <button onclick="updateProgramName()" class="upload-btn" style="padding: 8px 16px; width: auto;">UPDATE</button>
-                        </div>
-                        <div id="program-status" style="font-size: 11px; margin-top: 5px; height: 15px;"></div>
-                    </div>
-                </div>
-'''
-
-# JavaScript to insert
-program_js = '''
-        // Program Name Handling
-        function updateProgramName() {
-            const name = document.getElementById('programNameInput').value;
-            const statusDiv = document.getElementById('program-status');
-            
-            statusDiv.textContent = "Updating...";
-            statusDiv.style.color = "#ffc107";
-            
-            fetch('/set_program_name', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ program_name: name })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    statusDiv.textContent = "✓ Updated (Restart stream to apply)";
-                    statusDiv.style.color = "#28a745";
-                    setTimeout(() => statusDiv.textContent = '', 5000);
-                } else {
-                    statusDiv.textContent = "✗ Failed";
-                    statusDiv.style.color = "#dc3545";
-                }
-            })
-            .catch(err => {
-                statusDiv.textContent = "✗ Error";
-                statusDiv.style.color = "#dc3545";
-            });
-        }
-'''
-
-# Insert HTML before Overlay Controls
-overlay_marker = '<!-- Overlay Controls -->'
-if overlay_marker in content:
-    content = content.replace(overlay_marker, program_html + '\n\n' + overlay_marker)
-    print("✓ Inserted Program Info HTML")
-else:
-    print("✗ Could not find Overlay Controls marker")
+import sys
+from pathlib import Path
+
+from template_patch import find_markers, find_sentinels, read_template, splice_at, write_template
+
+TEMPLATE_PATH = 'templates/index.html'
+
+# Find insertion points
+overlay_marker = b'<!-- Overlay Controls -->'
+script_end_marker = b'    </script>'
+
+# One string from each inserted block (HTML, JavaScript) that only exists once
+# that block has been inserted
+PROGRAM_SENTINELS = (b'id="programNameInput"', b'function updateProgramName(')
+
+# HTML and JavaScript to insert, kept as plain files under snippets/ so they
+# are loaded as-is instead of being compiled as string literals. They are
+# loaded as bytes so nothing is decoded or re-encoded on the way through
+SNIPPETS_DIR = Path(__file__).resolve().parent / 'snippets'
+_PROGRAM_HTML_B = (SNIPPETS_DIR / 'program_info.html').read_bytes()
+_PROGRAM_JS_B = (SNIPPETS_DIR / 'program_info.js').read_bytes()
+
+
+def patch_program(path: str = TEMPLATE_PATH, *,
+                  html_blob: bytes = _PROGRAM_HTML_B, js_blob: bytes = _PROGRAM_JS_B) -> bool:
+    """
+    Insert the Program Info controls into the template at `path`
+    Returns True if the file was rewritten, False if it was already patched
+    """
+    content = read_template(path)
 
-# Insert JavaScript before </script>
-script_end_marker = '    </script>'
-if script_end_marker in content:
-    content = content.replace(script_end_marker, program_js + script_end_marker)
+    # Skip the rewrite entirely if a previous run already inserted the controls
+    found = find_sentinels(content, PROGRAM_SENTINELS)
+    if len(found) == len(PROGRAM_SENTINELS):
+        print("✓ Program Info controls already present in index.html, nothing to do")
+        return False
+    if found:
+        raise ValueError(f"{path} is only partially patched with the Program Info controls, fix it by hand")
+
+    offsets = find_markers(content, (overlay_marker, script_end_marker))
+
+    # Both blocks or neither: a half-patched file couldn't be detected (and
+    # would be patched again) on the next run
+    if overlay_marker not in offsets:
+        raise ValueError(f"Could not find Overlay Controls marker in {path}")
+    if script_end_marker not in offsets:
+        raise ValueError(f"Could not find script end marker in {path}")
+
+    splice_at(content, offsets, {overlay_marker: html_blob + b'\n\n', script_end_marker: js_blob})
+
+    print("✓ Inserted Program Info HTML")
     print("✓ Inserted Program Info JavaScript")
-else:
-    print("✗ Could not find script end marker")
 
-# Write back
-with open('templates/index.html', 'w', encoding='utf-8') as f:
-    f.write(content)
+    write_template(path, content)
+
+    return True
+
 
-print("Done!")
+if __name__ == '__main__':
+    try:
+        changed = patch_program()
+    except ValueError as e:
+        print(f"✗ {e}, index.html left unchanged")
+        sys.exit(1)
+    if changed:
+        print("Done!")
@@ -1,41 +1,129 @@
 import os
+import sys
+import asyncio
 import threading
 import subprocess
 import time
 import shutil
 import atexit
+import logging
+import string
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, render_template, request, jsonify, Response, send_from_directory
+from flask import Flask, render_template, request, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
 import config
 import psutil
 
+# state_manager and trash_manager log through `logging`; show their messages
+# like the rest of the app's console output
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+# Optional: kernel file notifications (inotify / ReadDirectoryChangesW) for
+# the segment monitor; falls back to polling the HLS directory without it
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# Optional: orjson for faster JSON responses; falls back to the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from state_manager import StateManager, SegmentTracker
 from trash_manager import TrashBinManager
-from trash_manager import TrashBinManager
 from overlay_manager import OverlayManager
 from content_provider import ContentProvider
+from hls_server import hls_bp
+from ffmpeg_output import build_output_args
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes responses with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        # Pretty-printing (indent) isn't worth reimplementing, leave it to json
+        if 'indent' in kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
 
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+if orjson is not None:
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
+
+# Viewer-facing /live/ routes (also runnable on their own, see hls_server.py)
+app.register_blueprint(hls_bp)
+
 # --- Configuration ---
 app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
 app.config['HLS_DIR'] = config.HLS_DIR
+app.use_x_sendfile = config.USE_X_SENDFILE
+
+def link_hls_dir_to_ram():
+    """
+    Point static/hls at config.HLS_RAM_DIR (opt-in) with a symlink
+    The first time, the on-disk directory's contents (segment metadata and
+    its log, the trash) are moved over rather than deleted; if the RAM
+    directory already holds any of the same names, HLS output stays on disk
+    """
+    ram_dir = config.HLS_RAM_DIR
+    if not ram_dir:
+        return
+    if os.name == 'nt':
+        print("HLS_RAM_DIR is not supported on Windows, keeping HLS output on disk")
+        return
+    
+    try:
+        os.makedirs(ram_dir, exist_ok=True)
+        if os.path.islink(config.HLS_DIR):
+            if os.path.realpath(config.HLS_DIR) == os.path.realpath(ram_dir):
+                return
+            os.unlink(config.HLS_DIR)
+        elif os.path.isdir(config.HLS_DIR):
+            with os.scandir(config.HLS_DIR) as entries:
+                names = [entry.name for entry in entries]
+            clashes = [name for name in names if os.path.lexists(os.path.join(ram_dir, name))]
+            if clashes:
+                print(f"Warning: {ram_dir} already contains {', '.join(clashes)}, keeping HLS output on disk")
+                return
+            for name in names:
+                shutil.move(os.path.join(config.HLS_DIR, name), os.path.join(ram_dir, name))
+            os.rmdir(config.HLS_DIR)
+        os.symlink(ram_dir, config.HLS_DIR, target_is_directory=True)
+        print(f"HLS output in RAM: {config.HLS_DIR} -> {ram_dir}")
+    except OSError as e:
+        print(f"Warning: could not move HLS output to {ram_dir}, keeping it on disk: {e}")
+
+# Must run before anything opens files under HLS_DIR
+link_hls_dir_to_ram()
 
 # Ensure directories exist
 os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(config.HLS_DIR, exist_ok=True)
 os.makedirs(config.TRASH_DIR, exist_ok=True)
 os.makedirs(config.OVERLAYS_DIR, exist_ok=True)
+if config.DASH_ENABLED:
+    os.makedirs(config.DASH_DIR, exist_ok=True)
 
 # --- Initialize State Management ---
 state_manager = StateManager()
-segment_tracker = SegmentTracker(config.SEGMENT_METADATA_FILE)
-trash_manager = TrashBinManager(config.HLS_DIR, config.TRASH_DIR, segment_tracker)
+segment_tracker = SegmentTracker(config.SEGMENT_METADATA_FILE, config.DURATION_CACHE_FILE, config.SEGMENT_LOG_FILE)
 trash_manager = TrashBinManager(config.HLS_DIR, config.TRASH_DIR, segment_tracker)
 overlay_manager = OverlayManager()
 content_provider = ContentProvider()
@@ -43,15 +131,164 @@ content_provider = ContentProvider()
 
 # --- Global Variables ---
 stop_event = threading.Event()
-segment_monitor_thread = None
+segment_observer = None
+background_thread = None
+
+# Latest system resource usage, refreshed by system_stats_loop; replaced
+# wholesale on each sample so readers never see a half-updated dict
+latest_system_stats = {}
+
+# Recent raw FFmpeg stderr chunks (only filled with VERBOSE_FFMPEG_LOGGING)
+ffmpeg_log = deque(maxlen=config.FFMPEG_LOG_CHUNKS)
+
+# --- FFmpeg Command ---
+# Parts of the command line that don't depend on the source, built once at
+# import instead of on every source switch. Kept as str rather than bytes:
+# on Windows Popen joins argv with list2cmdline, which only accepts str
+
+# Report a bad FFMPEG_PATH at startup rather than on every source switch
+if shutil.which(config.FFMPEG_PATH) is None:
+    print(f"Warning: FFmpeg not found at '{config.FFMPEG_PATH}', streaming will not work until FFMPEG_PATH in config.py is fixed")
+
+def detect_video_encoder():
+    """
+    Pick the H.264 encoder: config.HARDWARE_ENCODER if this FFmpeg build
+    provides it and a test encode succeeds, libx264 otherwise
+    (a build can list h264_nvenc without an NVIDIA GPU being present)
+    """
+    encoder = config.HARDWARE_ENCODER
+    if not encoder:
+        return 'libx264'
+    
+    try:
+        result = subprocess.run(
+            [config.FFMPEG_EXECUTABLE, '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=10
+        )
+        # Lines look like: " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+        if not any(line.split()[1:2] == [encoder] for line in result.stdout.splitlines()):
+            print(f"Warning: encoder {encoder} not available in this FFmpeg build, using libx264")
+            return 'libx264'
+        
+        # Encode a few frames to prove the device actually works
+        result = subprocess.run(
+            [config.FFMPEG_EXECUTABLE, '-hide_banner', '-v', 'error',
+             '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.2',
+             '-c:v', encoder, '-f', 'null', '-'],
+            capture_output=True, text=True, timeout=20
+        )
+        if result.returncode == 0:
+            print(f"Using hardware encoder: {encoder}")
+            return encoder
+        print(f"Warning: test encode with {encoder} failed, using libx264: {result.stderr.strip()[-200:]}")
+    except Exception as e:
+        print(f"Warning: could not query FFmpeg encoders ({e}), using libx264")
+    return 'libx264'
+
+VIDEO_ENCODER = detect_video_encoder()
+
+FFMPEG_BASE_ARGS = (config.FFMPEG_EXECUTABLE, '-y')
+if VIDEO_ENCODER == 'h264_nvenc':
+    # One named CUDA device shared by the decoder and the filters, so
+    # overlay_cuda gets both of its inputs from the same context
+    FFMPEG_BASE_ARGS += ('-init_hw_device', 'cuda=cu:0', '-filter_hw_device', 'cu')
+
+# Video codec; presets/tunes are libx264 options, hardware encoders use their defaults
+if VIDEO_ENCODER == 'libx264':
+    FFMPEG_VIDEO_CODEC_ARGS = ('-c:v', 'libx264', '-preset', config.VIDEO_PRESET, '-pix_fmt', 'yuv420p')
+    
+    # Only the live source needs zerolatency (no B-frames/lookahead);
+    # pre-recorded sources can afford them for better quality per bit.
+    # Keyframes are also forced on segment boundaries by time, so segments
+    # stay aligned even where a file's timestamps are irregular
+    FILE_TUNE_ARGS = (
+        '-tune', config.FILE_X264_TUNE, '-x264-params', config.FILE_X264_PARAMS,
+        '-bf', str(config.FILE_X264_BFRAMES), '-rc-lookahead', str(config.FILE_X264_LOOKAHEAD),
+        '-force_key_frames', f'expr:gte(t,n_forced*{config.HLS_SEGMENT_DURATION})'
+    )
+    LIVE_TUNE_ARGS = ('-tune', 'zerolatency', '-x264-params', config.LIVE_X264_PARAMS)
+    FFMPEG_TUNE_ARGS = {
+        'LIVE': LIVE_TUNE_ARGS,
+        'URL': FILE_TUNE_ARGS,
+        'QUEUE': FILE_TUNE_ARGS,
+        'IDLE': FILE_TUNE_ARGS
+    }
+elif VIDEO_ENCODER == 'h264_nvenc':
+    # p4 is NVENC's speed/quality knee; low-latency tuning, CBR, no B-frames.
+    # No -pix_fmt: decoded frames stay on the GPU, and forcing a CPU format
+    # would download and convert every one of them
+    FFMPEG_VIDEO_CODEC_ARGS = (
+        '-c:v', 'h264_nvenc', '-preset', 'p4', '-tune', 'll', '-rc', 'cbr',
+        '-bf', '0', '-zerolatency', '1', '-delay', '0'
+    )
+    FFMPEG_TUNE_ARGS = {}
+else:
+    FFMPEG_VIDEO_CODEC_ARGS = ('-c:v', VIDEO_ENCODER, '-pix_fmt', 'yuv420p')
+    FFMPEG_TUNE_ARGS = {}
+
+# With NVENC, decode file/URL sources on the GPU too and keep frames there.
+# Logo/banner overlays then run on the GPU too (overlay_cuda); drawtext has
+# no CUDA version, so with a program name everything stays on the CPU
+if VIDEO_ENCODER == 'h264_nvenc':
+    FFMPEG_HWACCEL_ARGS = ('-hwaccel', 'cuda', '-hwaccel_device', 'cu', '-hwaccel_output_format', 'cuda')
+else:
+    FFMPEG_HWACCEL_ARGS = ()
+
+# Output Options (HLS) - frame rate, rate control, keyframes and audio, shared
+# by every encoder. Constant frame rate keeps the encoder from reconfiguring
+# when a source's timing wobbles; threads 0 = one per core
+FFMPEG_ENCODE_ARGS = (
+    '-vsync', 'cfr', '-r', str(config.OUTPUT_FRAME_RATE), '-threads', '0',
+    '-b:v', config.VIDEO_BITRATE, '-maxrate', config.VIDEO_MAXRATE, '-bufsize', config.VIDEO_BUFSIZE,
+    '-g', str(config.GOP_SIZE), '-keyint_min', str(config.GOP_SIZE), '-sc_threshold', '0',
+    '-c:a', 'aac', '-b:a', config.AUDIO_BITRATE, '-ar', str(config.AUDIO_SAMPLE_RATE), '-ac', str(config.AUDIO_CHANNELS)
+)
+
+# Files that are part of the deployment and don't appear or disappear while
+# the app is running; checked once instead of on every FFmpeg restart
+FONT_EXISTS = os.path.exists(config.FONT_PATH)
+IDLE_SOURCE_EXISTS = os.path.exists(config.IDLE_SOURCE_PATH)
+
+# Pre-encoded idle loop (idle_cached.mp4 or idle_bars.ts) once it is up to
+# date, None until then (see prepare_idle_cache)
+idle_cache_path = None
+
+# Program name overlay; only the (escaped) text changes between restarts
+DRAWTEXT_TEMPLATE = string.Template(
+    "drawtext=text='$text':"
+    f"fontfile={config.FONT_PATH}:"
+    f"fontsize={config.FONT_SIZE}:fontcolor={config.FONT_COLOR}:"
+    f"x={config.PROGRAM_NAME_X}:y={config.PROGRAM_NAME_Y}:"
+    f"box=1:boxcolor={config.BOX_COLOR}:boxborderw={config.BOX_BORDER_WIDTH}"
+)
+
+# Escapes for the program name inside drawtext's quoted text, applied in one pass
+PROGRAM_NAME_ESCAPES = str.maketrans({':': '\\:', "'": "'\\\\''"})
 
 # --- Helper Functions ---
 
 def get_video_duration(file_path):
+    """
+    Get video duration, probing the file only if it is new or has changed
+    Results are cached by (path, mtime, size) in the segment tracker
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    
+    duration = segment_tracker.get_cached_duration(file_path, st.st_mtime_ns, st.st_size)
+    if duration is None:
+        duration = probe_video_duration(file_path)
+        if duration is not None:
+            segment_tracker.cache_duration(file_path, st.st_mtime_ns, st.st_size, duration)
+    return duration
+
+def probe_video_duration(file_path):
     """Get video duration using ffprobe"""
     try:
         cmd = [
-            config.FFMPEG_PATH.replace('ffmpeg', 'ffprobe'),
+            config.FFPROBE_EXECUTABLE,
             '-v', 'error',
             '-show_entries', 'format=duration',
             '-of', 'default=noprint_wrappers=1:nokey=1',
@@ -62,36 +299,212 @@ def get_video_duration(file_path):
     except:
         return None
 
+def save_overlay_upload(temp_prefix):
+    """
+    Save an uploaded overlay image to a temporary file in UPLOAD_FOLDER
+    Accepts a multipart 'file' field, or a raw request body with the original
+    filename in the 'name' query parameter (streamed to disk in chunks)
+    Returns: (temp_path, None) on success, (None, error_message) otherwise
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return None, 'No selected file'
+        filename = secure_filename(file.filename)
+        temp_path = os.path.join(config.UPLOAD_FOLDER, f'{temp_prefix}{filename}')
+        file.save(temp_path, buffer_size=config.UPLOAD_CHUNK_SIZE)
+        return temp_path, None
+    
+    name = request.args.get('name', '')
+    if not name:
+        return None, 'No file part'
+    
+    filename = secure_filename(name)
+    if not filename:
+        return None, 'No selected file'
+    
+    temp_path = os.path.join(config.UPLOAD_FOLDER, f'{temp_prefix}{filename}')
+    with open(temp_path, 'wb') as f:
+        while True:
+            chunk = request.stream.read(config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+    return temp_path, None
+
+def encoder_variant(path):
+    """Path of VIDEO_ENCODER's version of a pre-encoded clip"""
+    if VIDEO_ENCODER == 'libx264':
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{VIDEO_ENCODER}{ext}"
+
+def prepare_idle_cache():
+    """
+    Pre-encode the idle source with the stream's codec, GOP and audio
+    settings, so IDLE can be stream-copied (-c copy) instead of transcoded:
+    idle.mp4 becomes idle_cached.mp4 (rebuilt when idle.mp4 is newer), or
+    without idle.mp4 the SMPTE bars become a short idle_bars.ts clip.
+    Written to a temp file and renamed so a half-written cache is never used
+    """
+    global idle_cache_path
+    # Encoded with the stream's own encoder, so copied idle segments match the
+    # ones around them; each encoder gets its own file (libx264 keeps the plain name)
+    if VIDEO_ENCODER == 'libx264':
+        codec_args = ['-c:v', 'libx264', '-preset', config.IDLE_CACHE_PRESET, '-pix_fmt', 'yuv420p']
+    else:
+        codec_args = list(FFMPEG_VIDEO_CODEC_ARGS)
+    
+    if IDLE_SOURCE_EXISTS:
+        target = encoder_variant(config.IDLE_CACHE_PATH)
+        input_args = ['-i', config.IDLE_SOURCE_PATH]
+        output_args = ['-movflags', '+faststart', '-f', 'mp4']
+        if VIDEO_ENCODER == 'libx264':
+            output_args[:0] = ['-tune', config.FILE_X264_TUNE]
+        try:
+            if os.path.getmtime(target) >= os.path.getmtime(config.IDLE_SOURCE_PATH):
+                idle_cache_path = target
+                return
+        except OSError:
+            pass
+    else:
+        # Generated input never changes, so an existing clip is always valid
+        target = encoder_variant(config.IDLE_BARS_PATH)
+        input_args = [
+            '-f', 'lavfi', '-i', f'smptebars=size=1280x720:rate={config.OUTPUT_FRAME_RATE}',
+            '-f', 'lavfi', '-i', 'sine=frequency=440'
+        ]
+        output_args = ['-t', str(config.HLS_SEGMENT_DURATION), '-f', 'mpegts']
+        if os.path.exists(target):
+            idle_cache_path = target
+            return
+    
+    name = os.path.basename(target)
+    print(f"Preparing {name} (one-off encode of the idle source)...")
+    temp_path = target + '.tmp'
+    cmd = [
+        config.FFMPEG_EXECUTABLE, '-y', '-hide_banner', '-v', 'error',
+        *input_args,
+        *codec_args,
+        '-force_key_frames', f'expr:gte(t,n_forced*{config.HLS_SEGMENT_DURATION})',
+        *FFMPEG_ENCODE_ARGS,
+        *output_args, temp_path
+    ]
+    try:
+        result = subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            capture_output=True, text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        if result.returncode != 0:
+            print(f"Warning: could not prepare {name}, IDLE will be transcoded: {result.stderr.strip()[-200:]}")
+            return
+        os.replace(temp_path, target)
+        idle_cache_path = target
+        print(f"{name} ready")
+    except Exception as e:
+        print(f"Warning: could not prepare {name}, IDLE will be transcoded: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def write_filter_script(filter_graph):
+    """
+    Write the filter graph for -filter_complex_script
+    Keeps user text (program name) out of the command line, where Windows
+    would re-quote it; written to a temp file and renamed so an FFmpeg that
+    is starting up never reads a half-written graph
+    Returns: True if the script was written
+    """
+    temp_path = config.FILTER_SCRIPT_PATH + '.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(filter_graph)
+        os.replace(temp_path, config.FILTER_SCRIPT_PATH)
+        return True
+    except OSError as e:
+        print(f"Warning: could not write filter script, passing the graph inline: {e}")
+        return False
+
 def start_ffmpeg(source, source_type):
     """Start FFmpeg process with optimized settings"""
     print(f"Starting FFmpeg. Type: {source_type}, Source: {source}")
     
-    cmd = [config.FFMPEG_PATH, '-y']
+    cmd = list(FFMPEG_BASE_ARGS)
 
     # Get video duration for tracking
     video_duration = None
     if source_type == 'QUEUE' and os.path.exists(source):
         video_duration = get_video_duration(source)
 
+    # Program Name Overlay
+    program_name = state_manager.get_program_name()
+    final_output_label = "[out]"
+    draw_program_name = config.PROGRAM_NAME_ENABLED and program_name and FONT_EXISTS
+    
+    # Overlays (logo/banner); composited on the GPU when frames can stay there
+    gpu_overlay = bool(FFMPEG_HWACCEL_ARGS) and not draw_program_name
+    overlay_inputs, overlay_filter = overlay_manager.get_overlay_args(cuda=gpu_overlay)
+    
+    if draw_program_name:
+        # Only add text overlay if font file exists
+        # Escape special characters for FFmpeg
+        safe_program_name = program_name.translate(PROGRAM_NAME_ESCAPES)
+        
+        drawtext_filter = DRAWTEXT_TEMPLATE.substitute(text=safe_program_name)
+        
+        if overlay_filter:
+            # Chain it: [out] -> drawtext -> [out_final]
+            overlay_filter += f";{final_output_label}{drawtext_filter}[out_final]"
+            final_output_label = "[out_final]"
+        else:
+            # Apply directly to input: [0:v] -> drawtext -> [out]
+            overlay_filter = f"[0:v]{drawtext_filter}{final_output_label}"
+    elif config.PROGRAM_NAME_ENABLED and program_name:
+        print(f"Warning: Font file not found at {config.FONT_PATH}, skipping program name overlay")
+    
+    # GPU decoding only works when frames go straight to the encoder or
+    # through the CUDA overlay graph
+    hwaccel_args = [] if overlay_filter and not gpu_overlay else list(FFMPEG_HWACCEL_ARGS)
+    
+    # The pre-encoded idle loop already matches the stream, so with nothing
+    # to draw on it the packets can be copied straight into the segments
+    cached_idle = idle_cache_path
+    copy_idle = source_type == 'IDLE' and cached_idle is not None and not overlay_filter
+
+    # Generated sources (lavfi) bring their audio in as a second input
+    audio_map = '0:a?'
+    
+    # Looped and generated inputs never run out, so FFmpeg would read them as
+    # fast as it can encode (or, with -c copy, as fast as the disk allows) and
+    # flood the playlist with segments; -re reads them in real time instead
+    
     # Input Options
     if source_type == 'LIVE':
         # Webcam Input (Windows dshow) or test source
+        audio_map = '1:a'
         cmd.extend([
-            '-f', 'lavfi', '-i', 'testsrc=size=1280x720:rate=30',
-            '-f', 'lavfi', '-i', 'sine=frequency=1000'
+            '-re', '-f', 'lavfi', '-i', 'testsrc=size=1280x720:rate=30',
+            '-re', '-f', 'lavfi', '-i', 'sine=frequency=1000'
         ])
     elif source_type == 'IDLE':
-        if os.path.exists(source):
-            cmd.extend(['-stream_loop', '-1', '-i', source])
+        if copy_idle:
+            cmd.extend(['-re', '-stream_loop', '-1', '-i', cached_idle])
+        elif IDLE_SOURCE_EXISTS:
+            cmd.extend(hwaccel_args)
+            cmd.extend(['-re', '-stream_loop', '-1', '-i', source])
         else:
             print("Idle file not found, using generated SMPTE bars.")
+            audio_map = '1:a'
             cmd.extend([
-                '-f', 'lavfi', '-i', 'smptebars=size=1280x720:rate=30',
-                '-f', 'lavfi', '-i', 'sine=frequency=440'
+                '-re', '-f', 'lavfi', '-i', 'smptebars=size=1280x720:rate=30',
+                '-re', '-f', 'lavfi', '-i', 'sine=frequency=440'
             ])
     elif source_type == 'URL':
         # Remote URL (YouTube stream, etc.)
         # Add reconnect flags for stability
+        cmd.extend(hwaccel_args)
         cmd.extend([
             '-reconnect', '1',
             '-reconnect_streamed', '1',
@@ -100,80 +513,52 @@ def start_ffmpeg(source, source_type):
         ])
     else:
         # QUEUE (Standard File)
+        cmd.extend(hwaccel_args)
         cmd.extend(['-i', source])
 
     # Add overlay inputs if available
-    overlay_inputs = overlay_manager.get_overlay_inputs()
     for overlay_path in overlay_inputs:
         cmd.extend(['-i', overlay_path])
     
-    # Get overlay filter
-    overlay_filter = overlay_manager.get_ffmpeg_overlay_filter()
-    
-    # Program Name Overlay
-    program_name = state_manager.get_program_name()
-    final_output_label = "[out]"
-    
-    if config.PROGRAM_NAME_ENABLED and program_name and os.path.exists(config.FONT_PATH):
-        # Only add text overlay if font file exists
-        # Escape special characters for FFmpeg
-        safe_program_name = program_name.replace(":", "\\:").replace("'", "'\\\\''")
-        
-        drawtext_filter = (
-            f"drawtext=text='{safe_program_name}':fontfile={config.FONT_PATH}:"
-            f"fontsize={config.FONT_SIZE}:fontcolor={config.FONT_COLOR}:"
-            f"x={config.PROGRAM_NAME_X}:y={config.PROGRAM_NAME_Y}:"
-            f"box=1:boxcolor={config.BOX_COLOR}:boxborderw={config.BOX_BORDER_WIDTH}"
-        )
-        
-        if overlay_filter:
-            # Chain it: [out] -> drawtext -> [out_final]
-            overlay_filter += f";{final_output_label}{drawtext_filter}[out_final]"
-            final_output_label = "[out_final]"
-        else:
-            # Apply directly to input: [0:v] -> drawtext -> [out]
-            overlay_filter = f"[0:v]{drawtext_filter}{final_output_label}"
-    elif config.PROGRAM_NAME_ENABLED and program_name and not os.path.exists(config.FONT_PATH):
-        print(f"Warning: Font file not found at {config.FONT_PATH}, skipping program name overlay")
-    
-    # Output Options (HLS) - Optimized for CPU usage
-    cmd.extend([
-        '-c:v', 'libx264', '-preset', config.VIDEO_PRESET, '-tune', 'zerolatency',
-        '-b:v', config.VIDEO_BITRATE, '-maxrate', config.VIDEO_MAXRATE, '-bufsize', config.VIDEO_BUFSIZE,
-        '-g', str(config.GOP_SIZE), '-keyint_min', str(config.GOP_SIZE), '-sc_threshold', '0',
-        '-c:a', 'aac', '-b:a', config.AUDIO_BITRATE, '-ar', str(config.AUDIO_SAMPLE_RATE), '-ac', str(config.AUDIO_CHANNELS)
-    ])
+    # Output Options (HLS)
+    if copy_idle:
+        cmd.extend(['-c', 'copy'])
+    else:
+        cmd.extend(FFMPEG_VIDEO_CODEC_ARGS)
+        cmd.extend(FFMPEG_TUNE_ARGS.get(source_type, ()))
+        cmd.extend(FFMPEG_ENCODE_ARGS)
     
     # Add overlay filter if available
     if overlay_filter:
-        cmd.extend(['-filter_complex', overlay_filter, '-map', final_output_label, '-map', '0:a'])
-    
-    # HLS output settings
-    cmd.extend([
-        '-f', 'hls',
-        '-hls_time', str(config.HLS_SEGMENT_DURATION),
-        '-hls_list_size', str(config.HLS_PLAYLIST_SIZE),
-        '-hls_flags', 'delete_segments+append_list+program_date_time',
-        '-hls_segment_type', 'mpegts',
-        '-hls_segment_filename', os.path.join(config.HLS_DIR, 'segment%05d.ts'),
-        '-start_number', '0',
-        config.HLS_PLAYLIST
-    ])
+        cmd.extend(['-filter_complex_threads', '0'])
+        if write_filter_script(overlay_filter):
+            cmd.extend(['-filter_complex_script', config.FILTER_SCRIPT_PATH])
+        else:
+            cmd.extend(['-filter_complex', overlay_filter])
+        video_map = final_output_label
+    else:
+        video_map = '0:v'
+    
+    # Stream mapping and HLS (or HLS + DASH) output settings
+    cmd.extend(build_output_args(video_map, audio_map))
 
     # Start process (Windows-specific flags for hiding console window)
-    if os.name == 'nt':
+    # Nothing reads FFmpeg's stdout (output goes to the HLS files), so don't
+    # give it a pipe that could fill up and block it; stdin is closed so it
+    # never waits on or swallows console input
+    try:
         process = subprocess.Popen(
             cmd,
-            stdout=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
             stderr=subprocess.PIPE if config.VERBOSE_FFMPEG_LOGGING else subprocess.DEVNULL,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-    else:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE if config.VERBOSE_FFMPEG_LOGGING else subprocess.DEVNULL
+            bufsize=config.FFMPEG_LOG_READ_SIZE,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
         )
+    except OSError as e:
+        # Keep the stream manager alive; it retries on its next pass
+        print(f"Error starting FFmpeg: {e}")
+        return
     
     state_manager.set_current_process(process)
     
@@ -183,18 +568,43 @@ def start_ffmpeg(source, source_type):
     
     print(f"FFmpeg started. PID: {process.pid}")
     
+    # Wake the stream manager as soon as this process exits
+    waiter_thread = threading.Thread(target=wait_for_exit, args=(process,), daemon=True)
+    waiter_thread.start()
+    
     # Read stderr in a thread if verbose logging enabled
     if config.VERBOSE_FFMPEG_LOGGING:
-        def read_stderr():
-            for line in process.stderr:
-                try:
-                    print(f"FFmpeg: {line.decode('utf-8', errors='ignore').strip()}")
-                except:
-                    pass
-        
-        stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+        stderr_thread = threading.Thread(target=read_stderr, args=(process,), daemon=True)
         stderr_thread.start()
 
+def read_stderr(process):
+    """
+    Drain FFmpeg's stderr into the ffmpeg_log ring buffer
+    Reads raw 64KB chunks; decoding is left to /api/ffmpeg/log
+    """
+    fd = process.stderr.fileno()
+    try:
+        while True:
+            chunk = os.read(fd, config.FFMPEG_LOG_READ_SIZE)
+            if not chunk:
+                break
+            ffmpeg_log.append(chunk)
+    except OSError:
+        pass
+
+def wait_for_exit(process):
+    """Block until an FFmpeg process exits, then notify the stream manager"""
+    process.wait()
+    state_manager.notify_change()
+
+def has_exited(process):
+    """
+    Check whether an FFmpeg process has finished
+    The waiter thread's process.wait() sets returncode as soon as it exits,
+    so this is a plain attribute read rather than a waitpid() via poll()
+    """
+    return process.returncode is not None
+
 def stop_ffmpeg():
     """Stop FFmpeg process"""
     process = state_manager.get_current_process()
@@ -211,55 +621,153 @@ def stop_ffmpeg():
         
         print("FFmpeg stopped")
 
-def monitor_segments():
-    """Monitor HLS directory for new segments and track them"""
-    last_segments = set()
+def is_segment_file(filename):
+    """Check whether a file in the HLS directory is a media segment"""
+    return filename.startswith('segment') and filename.endswith(config.HLS_SEGMENT_EXTENSION)
+
+def track_new_segment(segment):
+    """Record a newly written segment against the current playback"""
+    # The active segment count just grew; let the trash manager check it
+    trash_manager.notify_new_segment()
+    
+    # Get current playback info
+    playback = state_manager.get_current_playback()
+    
+    if playback['source_type']:
+        # Track this segment
+        segment_tracker.add_segment(
+            segment_name=segment,
+            source_video=playback['playing_file'],
+            source_type=playback['source_type'],
+            start_time=playback['elapsed_time'],
+            duration=config.HLS_SEGMENT_DURATION
+        )
+        
+        state_manager.increment_segment_count()
+
+class SegmentEventHandler(FileSystemEventHandler):
+    """Tracks segments as soon as FFmpeg creates (or renames) them in the HLS directory"""
+    
+    def _handle(self, path):
+        segment = os.path.basename(path)
+        if not is_segment_file(segment):
+            return
+        try:
+            track_new_segment(segment)
+        except Exception as e:
+            print(f"Error in segment monitor: {e}")
+    
+    def on_created(self, event):
+        if not event.is_directory:
+            self._handle(event.src_path)
+    
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._handle(event.dest_path)
+
+def scan_segments():
+    """Yield (index, name) for every segment file in the HLS directory"""
+    ext_len = len(config.HLS_SEGMENT_EXTENSION)
+    with os.scandir(config.HLS_DIR) as entries:
+        for entry in entries:
+            name = entry.name
+            if not is_segment_file(name):
+                continue
+            try:
+                yield int(name[7:-ext_len]), name
+            except ValueError:
+                continue
+
+async def poll_segments():
+    """
+    Fallback segment monitor
+    Segments are numbered sequentially (segment%05d.ts), so each scan only
+    needs the highest index on disk; everything after the last index seen is new
+    """
+    last_idx = -1
+    last_process = None
+    # Segments left over from the previous FFmpeg run
+    stale = frozenset()
     
     while not stop_event.is_set():
         try:
-            # Get current segments
-            current_segments = set(trash_manager.get_active_segments())
+            process = state_manager.get_current_process()
+            if process is not None and process is not last_process:
+                # FFmpeg restarted and may number from start_number again
+                # while the old run's segments are still on disk: skip the
+                # ones already tracked and start over
+                stale = frozenset(
+                    name for idx, name in scan_segments()
+                    if idx <= last_idx or name in stale
+                )
+                last_idx = -1
+            last_process = process
             
-            # Find new segments
-            new_segments = current_segments - last_segments
+            min_idx = max_idx = -1
+            for idx, name in scan_segments():
+                if name in stale:
+                    continue
+                if idx > max_idx:
+                    max_idx = idx
+                if min_idx == -1 or idx < min_idx:
+                    min_idx = idx
             
-            for segment in new_segments:
-                # Get current playback info
-                playback = state_manager.get_current_playback()
-                
-                if playback['source_type']:
-                    # Track this segment
-                    segment_tracker.add_segment(
-                        segment_name=segment,
-                        source_video=playback['playing_file'],
-                        source_type=playback['source_type'],
-                        start_time=playback['elapsed_time'],
-                        duration=config.HLS_SEGMENT_DURATION
-                    )
-                    
-                    state_manager.increment_segment_count()
+            # Start from the oldest new segment on disk, not 0, after a (re)start
+            for idx in range(max(last_idx + 1, min_idx), max_idx + 1):
+                segment = f'segment{idx:05d}{config.HLS_SEGMENT_EXTENSION}'
+                if segment not in stale:
+                    track_new_segment(segment)
             
-            last_segments = current_segments
+            if max_idx > last_idx:
+                last_idx = max_idx
             
         except Exception as e:
             print(f"Error in segment monitor: {e}")
         
-        time.sleep(1)
+        await asyncio.sleep(config.SEGMENT_POLL_INTERVAL)
+
+def start_segment_watcher():
+    """
+    Start tracking new segments from file-system events
+    Returns: True if the watcher is running, False if polling is needed
+    """
+    global segment_observer
+    if Observer is None:
+        return False
+    
+    try:
+        observer = Observer()
+        observer.schedule(SegmentEventHandler(), config.HLS_DIR, recursive=False)
+        observer.start()
+    except Exception as e:
+        print(f"Segment watcher unavailable ({e}), falling back to polling")
+        return False
+    
+    # Events are handled on the observer's own thread
+    segment_observer = observer
+    return True
 
 # --- Background Manager ---
 
 def stream_manager_loop():
     """Main stream management loop"""
     while not stop_event.is_set():
+        # Anything that changes after this point wakes the waits below
+        version = state_manager.get_version()
+        
+        # Both flags from one snapshot, so a request flipping them together
+        # can't be seen half-applied
+        is_broadcasting, is_live_camera_mode = state_manager.get_mode()
+        
         # 1. Check Broadcast State
-        if not state_manager.is_broadcasting():
+        if not is_broadcasting:
             if state_manager.get_current_process():
                 stop_ffmpeg()
-            time.sleep(1)
+            state_manager.wait_for_change(version, config.STREAM_MANAGER_WAIT_TIMEOUT)
             continue
 
         # 2. Check Live Camera Mode
-        if state_manager.is_live_camera_mode():
+        if is_live_camera_mode:
             playback = state_manager.get_current_playback()
             if playback['source_type'] != 'LIVE':
                 stop_ffmpeg()
@@ -267,11 +775,11 @@ def stream_manager_loop():
             
             # Restart if crashed
             process = state_manager.get_current_process()
-            if process and process.poll() is not None:
+            if process and has_exited(process):
                 print("Live process died, restarting...")
                 start_ffmpeg(None, 'LIVE')
             
-            time.sleep(1)
+            state_manager.wait_for_change(version, config.STREAM_MANAGER_WAIT_TIMEOUT)
             continue
 
         # 3. Queue / Idle Mode
@@ -279,7 +787,7 @@ def stream_manager_loop():
         playback = state_manager.get_current_playback()
         
         # Check if current process finished
-        if process and process.poll() is not None:
+        if process and has_exited(process):
             print(f"Process finished (Type: {playback['source_type']}).")
             state_manager.clear_current_process()
             state_manager.clear_current_playback()
@@ -291,13 +799,13 @@ def stream_manager_loop():
                 print("New item in queue, stopping IDLE...")
                 stop_ffmpeg()
             else:
-                time.sleep(1)
+                state_manager.wait_for_change(version, config.STREAM_MANAGER_WAIT_TIMEOUT)
                 continue
 
         # Nothing running. Decide what to play.
-        if state_manager.queue_length() > 0:
+        next_file = state_manager.pop_from_queue()
+        if next_file is not None:
             # Play next in queue
-            next_file = state_manager.pop_from_queue()
             file_path = os.path.join(config.UPLOAD_FOLDER, next_file)
             if os.path.exists(file_path):
                 # If coming from auto mode, we might want to reset program name or keep it?
@@ -323,21 +831,97 @@ def stream_manager_loop():
             else:
                 print("[AUTO MODE] Failed to fetch video, falling back to IDLE...")
                 start_ffmpeg(config.IDLE_SOURCE_PATH, 'IDLE')
-                # Sleep a bit longer to avoid rapid retry loops if API is down
-                time.sleep(5)
+                # Back off a bit to avoid rapid retry loops if API is down,
+                # without holding up shutdown
+                stop_event.wait(5)
                 
         else:
             # Queue empty -> Play IDLE
             start_ffmpeg(config.IDLE_SOURCE_PATH, 'IDLE')
         
-        time.sleep(1)
+        state_manager.wait_for_change(version, config.STREAM_MANAGER_WAIT_TIMEOUT)
+
+def sample_system_stats(ffmpeg_proc):
+    """
+    Take one resource usage sample
+    psutil's cpu_percent(None) measures since the previous call, so this
+    never blocks; `ffmpeg_proc` is the psutil handle from the last sample
+    Returns: (stats, ffmpeg_proc)
+    """
+    cpu_percent = psutil.cpu_percent(None)
+    memory = psutil.virtual_memory()
+    
+    # Get FFmpeg process stats if running
+    ffmpeg_stats = None
+    process = state_manager.get_current_process()
+    if process:
+        try:
+            if ffmpeg_proc is None or ffmpeg_proc.pid != process.pid:
+                # New process: the first reading only starts the measurement
+                ffmpeg_proc = psutil.Process(process.pid)
+                ffmpeg_proc.cpu_percent(None)
+            ffmpeg_stats = {
+                'cpu_percent': ffmpeg_proc.cpu_percent(None),
+                'memory_mb': ffmpeg_proc.memory_info().rss / (1024 * 1024)
+            }
+        except psutil.Error:
+            ffmpeg_proc = None
+    else:
+        ffmpeg_proc = None
+    
+    stats = {
+        'cpu_percent': cpu_percent,
+        'memory_percent': memory.percent,
+        'memory_used_mb': memory.used / (1024 * 1024),
+        'memory_total_mb': memory.total / (1024 * 1024),
+        'ffmpeg': ffmpeg_stats
+    }
+    return stats, ffmpeg_proc
+
+async def system_stats_loop():
+    """Refresh latest_system_stats every STATS_UPDATE_INTERVAL seconds"""
+    global latest_system_stats
+    ffmpeg_proc = None
+    
+    while not stop_event.is_set():
+        try:
+            latest_system_stats, ffmpeg_proc = sample_system_stats(ffmpeg_proc)
+        except Exception as e:
+            print(f"Error sampling system stats: {e}")
+        
+        await asyncio.sleep(config.STATS_UPDATE_INTERVAL)
+
+async def segment_flush_loop():
+    """Write batched segment metadata to disk (and compact it) every SEGMENT_FLUSH_INTERVAL seconds"""
+    while not stop_event.is_set():
+        await asyncio.sleep(config.SEGMENT_FLUSH_INTERVAL)
+        try:
+            segment_tracker.flush()
+        except Exception as e:
+            print(f"Error flushing segment metadata: {e}")
+
+async def periodic_tasks():
+    """Run the periodic background jobs together on one event loop"""
+    tasks = [system_stats_loop(), segment_flush_loop()]
+    if not start_segment_watcher():
+        tasks.append(poll_segments())
+    await asyncio.gather(*tasks)
+
+def run_periodic_tasks():
+    """Thread target: host the periodic jobs' event loop"""
+    asyncio.run(periodic_tasks())
 
 # Start Background Threads
 bg_thread = threading.Thread(target=stream_manager_loop, daemon=True)
 bg_thread.start()
 
-segment_monitor_thread = threading.Thread(target=monitor_segments, daemon=True)
-segment_monitor_thread.start()
+# One-off idle.mp4 pre-encode; IDLE is transcoded as before until it's done
+idle_cache_thread = threading.Thread(target=prepare_idle_cache, daemon=True)
+idle_cache_thread.start()
+
+# Periodic jobs (stats sampling, segment polling fallback) share one thread
+background_thread = threading.Thread(target=run_periodic_tasks, daemon=True)
+background_thread.start()
 
 # --- Routes ---
 
@@ -354,7 +938,12 @@ def upload_file():
         return jsonify({'error': 'No selected file'}), 400
     if file:
         filename = secure_filename(file.filename)
-        file.save(os.path.join(config.UPLOAD_FOLDER, filename))
+        file_path = os.path.join(config.UPLOAD_FOLDER, filename)
+        # 1MB copy chunks instead of Werkzeug's 16KB default
+        file.save(file_path, buffer_size=config.UPLOAD_CHUNK_SIZE)
+        # Probe in the background, so starting playback never forks ffprobe
+        # and the upload response doesn't wait for it either
+        threading.Thread(target=get_video_duration, args=(file_path,), daemon=True).start()
         state_manager.add_to_queue(filename)
         return jsonify({'success': True, 'filename': filename})
 
@@ -404,71 +993,26 @@ def api_trash_stats():
 
 @app.route('/api/system/stats')
 def api_system_stats():
-    """Get system resource usage"""
+    """Get system resource usage (sampled in the background by system_stats_loop)"""
     try:
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory()
-        
-        # Get FFmpeg process stats if running
-        ffmpeg_stats = None
-        process = state_manager.get_current_process()
-        if process:
-            try:
-                p = psutil.Process(process.pid)
-                ffmpeg_stats = {
-                    'cpu_percent': p.cpu_percent(interval=0.1),
-                    'memory_mb': p.memory_info().rss / (1024 * 1024)
-                }
-            except:
-                pass
-        
-        return jsonify({
-            'cpu_percent': cpu_percent,
-            'memory_percent': memory.percent,
-            'memory_used_mb': memory.used / (1024 * 1024),
-            'memory_total_mb': memory.total / (1024 * 1024),
-            'ffmpeg': ffmpeg_stats
-        })
+        return jsonify(latest_system_stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# --- Virtual Stream Routes (Username Support) ---
-
-@app.route('/live/<username>/stream.m3u8')
-def user_stream_playlist(username):
-    """Serve the main playlist under a user-specific URL"""
-    # We ignore the username for now and serve the same stream
-    # This creates the illusion of a unique link
-    return send_from_directory(config.HLS_DIR, 'stream.m3u8')
-
-@app.route('/live/<username>/playlist.m3u')
-def user_stream_playlist_m3u(username):
-    """Serve a Master Playlist (M3U) for IPTV players"""
-    host = request.host_url.rstrip('/')
-    stream_url = f"{host}/live/{username}/stream.m3u8"
-    logo_url = "https://seeklogo.com/images/T/tv-logo-F7231DA292-seeklogo.com.png"
-    
-    # M3U content with logo
-    content = f"""#EXTM3U
-#EXTINF:-1 tvg-id="sinlive" tvg-name="SinLive" tvg-logo="{logo_url}" group-title="Live",SinLive Stream
-{stream_url}"""
-
-    return Response(content, mimetype='text/plain')
-
-@app.route('/live/<username>/<path:filename>')
-def user_stream_segment(username, filename):
-    """Serve HLS segments under a user-specific URL"""
-    return send_from_directory(config.HLS_DIR, filename)
+@app.route('/api/ffmpeg/log')
+def api_ffmpeg_log():
+    """Get recent FFmpeg output (requires VERBOSE_FFMPEG_LOGGING)"""
+    output = b''.join(list(ffmpeg_log)).decode('utf-8', errors='ignore')
+    return jsonify({
+        'enabled': config.VERBOSE_FFMPEG_LOGGING,
+        'lines': output.splitlines()
+    })
 
 # --- Control Endpoints ---
 
 @app.route('/start_broadcast', methods=['POST'])
 def start_broadcast():
-    state_manager.set_broadcasting(True)
-    state_manager.set_live_camera_mode(False)
+    state_manager.set_mode(True, False)
     return jsonify({'success': True})
 
 @app.route('/stop_broadcast', methods=['POST'])
@@ -478,14 +1022,12 @@ def stop_broadcast():
 
 @app.route('/go_live_stream', methods=['POST'])
 def go_live_stream():
-    state_manager.set_broadcasting(True)
-    state_manager.set_live_camera_mode(True)
+    state_manager.set_mode(True, True)
     return jsonify({'success': True})
 
 @app.route('/end_live_stream', methods=['POST'])
 def end_live_stream():
-    state_manager.set_broadcasting(True)
-    state_manager.set_live_camera_mode(False)
+    state_manager.set_mode(True, False)
     return jsonify({'success': True})
 
 # --- Overlay Endpoints ---
@@ -493,7 +1035,7 @@ def end_live_stream():
 @app.route('/set_program_name', methods=['POST'])
 def set_program_name():
     """Update the program name overlay text"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     name = data.get('program_name', '')
     state_manager.set_program_name(name)
     return jsonify({'success': True, 'program_name': name})
@@ -501,70 +1043,54 @@ def set_program_name():
 @app.route('/upload_logo', methods=['POST'])
 def upload_logo():
     """Upload logo image for watermark"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    # Save temporarily
+    temp_path, error = save_overlay_upload('temp_logo_')
+    if error:
+        return jsonify({'error': error}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    # Process with overlay manager
+    success, message, info = overlay_manager.save_logo(temp_path)
     
-    if file:
-        # Save temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(config.UPLOAD_FOLDER, f'temp_logo_{filename}')
-        file.save(temp_path)
-        
-        # Process with overlay manager
-        success, message, info = overlay_manager.save_logo(temp_path)
-        
-        # Remove temp file
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': message,
-                'info': info
-            })
-        else:
-            return jsonify({'error': message}), 400
+    # Remove temp file
+    try:
+        os.remove(temp_path)
+    except:
+        pass
+    
+    if success:
+        return jsonify({
+            'success': True,
+            'message': message,
+            'info': info
+        })
+    else:
+        return jsonify({'error': message}), 400
 
 @app.route('/upload_banner', methods=['POST'])
 def upload_banner():
     """Upload banner image"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    # Save temporarily
+    temp_path, error = save_overlay_upload('temp_banner_')
+    if error:
+        return jsonify({'error': error}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    # Process with overlay manager
+    success, message, info = overlay_manager.save_banner(temp_path)
     
-    if file:
-        # Save temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(config.UPLOAD_FOLDER, f'temp_banner_{filename}')
-        file.save(temp_path)
-        
-        # Process with overlay manager
-        success, message, info = overlay_manager.save_banner(temp_path)
-        
-        # Remove temp file
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': message,
-                'info': info
-            })
-        else:
-            return jsonify({'error': message}), 400
+    # Remove temp file
+    try:
+        os.remove(temp_path)
+    except:
+        pass
+    
+    if success:
+        return jsonify({
+            'success': True,
+            'message': message,
+            'info': info
+        })
+    else:
+        return jsonify({'error': message}), 400
 
 @app.route('/delete_logo', methods=['POST'])
 def delete_logo():
@@ -585,12 +1111,17 @@ def delete_banner():
 @app.route('/overlay_status')
 def overlay_status():
     """Get current overlay status and recommendations"""
-    return jsonify(overlay_manager.get_status())
+    # ETag lets clients revalidate with If-None-Match and get an empty 304
+    # when nothing changed
+    response = jsonify(overlay_manager.get_status())
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/toggle_overlay', methods=['POST'])
 def toggle_overlay():
     """Toggle overlay system on/off"""
-    data = request.get_json() or {}
+    data = request.get_json(silent=True) or {}
     overlay_type = data.get('type')  # 'logo', 'banner', or 'all'
     enabled = data.get('enabled', True)
     
@@ -614,7 +1145,7 @@ def toggle_overlay():
 
 @app.route('/api/automode/start', methods=['POST'])
 def start_auto_mode():
-    data = request.json or {}
+    data = request.get_json(silent=True) or {}
     hashtag = data.get('hashtag')
     
     if hashtag:
@@ -636,7 +1167,7 @@ def stop_auto_mode():
 
 @app.route('/api/automode/set_hashtag', methods=['POST'])
 def set_auto_hashtag():
-    data = request.json
+    data = request.get_json(silent=True) or {}
     hashtag = data.get('hashtag')
     if hashtag:
         state_manager.set_current_hashtag(hashtag)
@@ -649,13 +1180,41 @@ def cleanup():
     """Cleanup resources on application exit"""
     print("Cleaning up...")
     stop_event.set()
+    state_manager.notify_change()
+    if segment_observer:
+        segment_observer.stop()
     stop_ffmpeg()
     trash_manager.stop()
+    segment_tracker.flush()
+
+def unlink_files(paths):
+    """
+    Delete a batch of files; large batches are spread over a thread pool
+    (os.unlink releases the GIL, so the deletes really run in parallel)
+    Returns: number of files deleted
+    """
+    def unlink(path):
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            # Already gone (e.g. FFmpeg's delete_segments got there first)
+            return False
+        except Exception as e:
+            print(f"Failed to delete {path}. Reason: {e}")
+            return False
+    
+    if len(paths) < config.CLEANUP_PARALLEL_THRESHOLD:
+        return sum(map(unlink, paths))
+    
+    with ThreadPoolExecutor(max_workers=config.CLEANUP_WORKERS) as pool:
+        return sum(pool.map(unlink, paths))
 
 def cleanup_on_startup():
     """
     Perform cleanup on application startup:
-    1. Delete all files in static/hls EXCEPT stream.m3u8
+    1. Delete all files in static/hls EXCEPT stream.m3u8 and the segment
+       metadata snapshot/log (and static/dash)
     2. Delete all files in overlays directory
     3. Create placeholder stream.m3u8 if it doesn't exist
     """
@@ -664,31 +1223,50 @@ def cleanup_on_startup():
     # 1. Clean HLS directory
     if os.path.exists(config.HLS_DIR):
         print(f"Cleaning HLS directory: {config.HLS_DIR}")
-        for filename in os.listdir(config.HLS_DIR):
-            file_path = os.path.join(config.HLS_DIR, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    # Keep stream.m3u8, delete everything else
-                    if filename != 'stream.m3u8':
-                        os.unlink(file_path)
-                        print(f"Deleted: {filename}")
-                elif os.path.isdir(file_path) and filename != 'trash':
-                    # Optional: delete subdirectories if any (except trash)
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f"Failed to delete {file_path}. Reason: {e}")
+        # scandir's entries carry the file type from the directory read, so
+        # no extra stat() per file
+        # The segment tracker has already loaded the metadata files and keeps
+        # appending to the log, so they stay
+        keep = {config.HLS_PLAYLIST, config.SEGMENT_METADATA_FILE, config.SEGMENT_LOG_FILE}
+        files_to_delete = []
+        with os.scandir(config.HLS_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                        # Keep stream.m3u8 and segment metadata, delete everything else
+                        if entry.path not in keep:
+                            files_to_delete.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False) and entry.name != 'trash':
+                        # Optional: delete subdirectories if any (except trash)
+                        shutil.rmtree(entry.path)
+                except Exception as e:
+                    print(f"Failed to delete {entry.path}. Reason: {e}")
+        
+        deleted = unlink_files(files_to_delete)
+        print(f"Deleted {deleted} files from HLS directory")
+    
+    # DASH output from a previous run is just as stale
+    if config.DASH_ENABLED and os.path.exists(config.DASH_DIR):
+        with os.scandir(config.DASH_DIR) as entries:
+            files_to_delete = [entry.path for entry in entries if entry.is_file(follow_symlinks=False)]
+        deleted = unlink_files(files_to_delete)
+        print(f"Deleted {deleted} files from DASH directory")
     
     # 2. Clean Overlays directory
     if os.path.exists(config.OVERLAYS_DIR):
         print(f"Cleaning Overlays directory: {config.OVERLAYS_DIR}")
-        for filename in os.listdir(config.OVERLAYS_DIR):
-            file_path = os.path.join(config.OVERLAYS_DIR, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                    print(f"Deleted overlay: {filename}")
-            except Exception as e:
-                print(f"Failed to delete {file_path}. Reason: {e}")
+        with os.scandir(config.OVERLAYS_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                        os.unlink(entry.path)
+                        print(f"Deleted overlay: {entry.name}")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    print(f"Failed to delete {entry.path}. Reason: {e}")
+        # The stream manager may already have built its overlay args
+        overlay_manager.refresh()
     
     # 3. Create placeholder stream.m3u8 if it doesn't exist
     # This prevents 404 errors when clients try to access the stream before FFmpeg starts
@@ -709,5 +1287,17 @@ def cleanup_on_startup():
 atexit.register(cleanup)
 
 if __name__ == '__main__':
+    # Shared state lives behind locks (StateManager, SegmentTracker,
+    # TrashBinManager, OverlayManager) and module globals are only ever
+    # swapped whole, so the app also runs on free-threaded builds (3.13t+)
+    if hasattr(sys, '_is_gil_enabled') and not sys._is_gil_enabled():
+        print("Free-threaded Python detected: background threads run in parallel")
     cleanup_on_startup()
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress not installed, falling back to the Flask development server")
+        app.run(host=config.SERVER_HOST, port=config.SERVER_PORT, debug=False)
+    else:
+        print(f"Serving on http://{config.SERVER_HOST}:{config.SERVER_PORT} (waitress, {config.SERVER_THREADS} threads)")
+        serve(app, host=config.SERVER_HOST, port=config.SERVER_PORT, threads=config.SERVER_THREADS)
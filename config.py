@@ -4,6 +4,7 @@ Centralized settings for segment management, FFmpeg parameters, and system resou
 """
 
 import os
+import shutil
 
 # --- Directory Configuration ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,10 +13,32 @@ HLS_DIR = os.path.join(BASE_DIR, 'static', 'hls')
 TRASH_DIR = os.path.join(HLS_DIR, 'trash')
 HLS_PLAYLIST = os.path.join(HLS_DIR, 'stream.m3u8')
 SEGMENT_METADATA_FILE = os.path.join(HLS_DIR, 'segments_metadata.json')
+# Append-only log of segment metadata changes made since the snapshot above
+SEGMENT_LOG_FILE = os.path.join(HLS_DIR, 'segments_metadata.jsonl')
+# Optional RAM-backed directory (e.g. '/dev/shm/macicast-hls' on Linux) for
+# the HLS output. static/hls is replaced by a symlink to it at startup, so paths
+# and URLs don't change but segments never hit the disk. What static/hls held
+# is moved there the first time. Segment history and the trash then live in
+# RAM too (size TRASH_RETENTION_TIME accordingly, and they don't survive a reboot)
+HLS_RAM_DIR = None
 IDLE_SOURCE_PATH = os.path.join(BASE_DIR, 'idle.mp4')
+# idle.mp4 re-encoded once with the stream's codec/GOP settings, so the idle
+# loop can be stream-copied instead of transcoded (rebuilt when idle.mp4 changes)
+IDLE_CACHE_PATH = os.path.join(BASE_DIR, 'idle_cached.mp4')
+# Same for the generated SMPTE bars used when there is no idle.mp4: a short
+# clip encoded once and looped with -c copy
+IDLE_BARS_PATH = os.path.join(BASE_DIR, 'idle_bars.ts')
+# ffprobe results for uploaded videos, kept with the uploads so they survive restarts
+DURATION_CACHE_FILE = os.path.join(UPLOAD_FOLDER, 'durations.json')
 
 # *** CRITICAL: Set your absolute FFmpeg path here ***
 FFMPEG_PATH = "ffmpeg"
+# ffprobe from the same FFmpeg install
+FFPROBE_PATH = FFMPEG_PATH.replace('ffmpeg', 'ffprobe')
+# Resolved once (a bare name is looked up on PATH); every FFmpeg/ffprobe
+# launch uses these. Unresolvable paths are kept as-is so errors name them
+FFMPEG_EXECUTABLE = shutil.which(FFMPEG_PATH) or FFMPEG_PATH
+FFPROBE_EXECUTABLE = shutil.which(FFPROBE_PATH) or FFPROBE_PATH
 
 # --- Segment Management Configuration ---
 # Maximum number of segments to keep in active directory (older ones moved to trash)
@@ -30,19 +53,62 @@ HLS_SEGMENT_DURATION = 2
 # Number of segments to keep in playlist
 HLS_PLAYLIST_SIZE = 10
 
+# Segment container: 'mpegts' (.ts, widest player support) or 'fmp4'
+# (fragmented MP4 .m4s + init.mp4, less muxing overhead per segment; needs a
+# player with fMP4 HLS support, e.g. hls.js, Safari, ExoPlayer)
+HLS_SEGMENT_TYPE = 'mpegts'
+HLS_SEGMENT_EXTENSION = '.m4s' if HLS_SEGMENT_TYPE == 'fmp4' else '.ts'
+HLS_FMP4_INIT_FILENAME = 'init.mp4'
+
+# Also write a low-latency DASH stream (static/dash/stream.mpd) from the same
+# encode via FFmpeg's tee muxer; segments match HLS_SEGMENT_DURATION since
+# they can only start on the GOP_SIZE keyframes
+DASH_ENABLED = False
+DASH_DIR = os.path.join(BASE_DIR, 'static', 'dash')
+DASH_MANIFEST = os.path.join(DASH_DIR, 'stream.mpd')
+
 # --- FFmpeg Encoding Configuration ---
 # Video encoding preset (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)
 # veryfast provides good balance between CPU usage and quality
 VIDEO_PRESET = 'veryfast'
 
+# Hardware H.264 encoder to use instead of libx264 ('h264_nvenc', 'h264_qsv',
+# 'h264_videotoolbox'), or None for libx264. Checked at startup with a short
+# test encode and ignored (libx264 is used) if the device isn't usable
+HARDWARE_ENCODER = None
+
+# libx264 tuning for pre-recorded sources (QUEUE, IDLE and URL videos), where
+# latency doesn't matter and B-frames/lookahead (mbtree) give better quality
+# per bit. Only the LIVE source keeps -tune zerolatency
+FILE_X264_TUNE = 'film'
+FILE_X264_PARAMS = 'threads=auto:lookahead_threads=2:sliced_threads=0'
+FILE_X264_BFRAMES = 3
+FILE_X264_LOOKAHEAD = 20
+
+# Preset for the one-off idle_cached.mp4 / idle_bars.ts encodes; they only
+# run when the idle source changes, so they can trade encode time for quality
+IDLE_CACHE_PRESET = 'slow'
+
+# libx264 threading for the zerolatency path (LIVE): split each frame into
+# slices encoded in parallel (one per core, up to 8) instead of frame threads,
+# which would add a frame of latency per thread
+LIVE_X264_PARAMS = (
+    f"sliced-threads=1:slices={min(os.cpu_count() or 4, 8)}:threads=auto:"
+    "sync-lookahead=0:rc-lookahead=0:bframes=0"
+)
+
 # Video bitrate settings
 VIDEO_BITRATE = '2500k'
 VIDEO_MAXRATE = '3000k'
 VIDEO_BUFSIZE = '6000k'
 
+# Output frame rate; every source is converted to constant frame rate at
+# this rate so the encoder never reconfigures mid-stream
+OUTPUT_FRAME_RATE = 30
+
 # GOP (Group of Pictures) size - keyframe interval
 # Lower value = more keyframes = better seeking but higher bitrate
-GOP_SIZE = 60  # 2 seconds at 30fps
+GOP_SIZE = 2 * OUTPUT_FRAME_RATE  # 2 seconds
 
 # Audio settings
 AUDIO_BITRATE = '128k'
@@ -53,8 +119,35 @@ AUDIO_CHANNELS = 2
 # Interval in seconds for updating system stats
 STATS_UPDATE_INTERVAL = 2
 
-# Interval in seconds for segment cleanup check
-CLEANUP_CHECK_INTERVAL = 10
+# Interval in seconds for the polling segment monitor (only used when
+# file-system notifications aren't available)
+SEGMENT_POLL_INTERVAL = 1
+
+# Maximum seconds the stream manager waits for a state change before re-checking
+STREAM_MANAGER_WAIT_TIMEOUT = 5
+
+# --- Web Server Configuration ---
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+
+# Port for running the /live/ routes on their own (python hls_server.py), so
+# viewer traffic doesn't compete with the dashboard and control API
+HLS_SERVER_PORT = 5001
+
+# Worker threads for the waitress server
+SERVER_THREADS = 16
+
+# Hand HLS playlist/segment delivery to the front-end web server instead of
+# reading files in Python. Set HLS_X_ACCEL_PREFIX to an nginx `internal`
+# location aliased to HLS_DIR (e.g. '/internal-hls/') to answer /live/ requests
+# with X-Accel-Redirect; USE_X_SENDFILE emits X-Sendfile (Apache/lighttpd)
+HLS_X_ACCEL_PREFIX = None
+USE_X_SENDFILE = False
+
+# Startup cleanup deletes files on a thread pool once a directory holds at
+# least this many (e.g. thousands of leftover segments after a crash)
+CLEANUP_PARALLEL_THRESHOLD = 256
+CLEANUP_WORKERS = 16
 
 # --- Resource Limits ---
 # Maximum CPU percentage threshold for warnings
@@ -67,6 +160,24 @@ MAX_MEMORY_THRESHOLD = 1024
 # Enable detailed FFmpeg logging (set to False for production)
 VERBOSE_FFMPEG_LOGGING = False
 
+# FFmpeg stderr is read in chunks of this many bytes and the most recent
+# FFMPEG_LOG_CHUNKS chunks are kept for /api/ffmpeg/log
+FFMPEG_LOG_READ_SIZE = 65536
+FFMPEG_LOG_CHUNKS = 200
+
+# Segment metadata is written to disk in batches: after this many changes
+# (new segments, status updates), or at least every SEGMENT_FLUSH_INTERVAL seconds
+SEGMENT_FLUSH_BATCH = 16
+SEGMENT_FLUSH_INTERVAL = 10
+
+# The change log is folded back into the metadata snapshot (and emptied) once
+# it reaches this many bytes
+SEGMENT_LOG_COMPACT_SIZE = 1 << 20
+
+# Seconds a /api/state snapshot is reused by pollers (any state change
+# invalidates it immediately)
+FULL_STATE_CACHE_TTL = 0.2
+
 # Enable segment tracking debug logs
 DEBUG_SEGMENT_TRACKING = True
 
@@ -75,6 +186,9 @@ DEBUG_SEGMENT_TRACKING = True
 OVERLAYS_DIR = os.path.join(BASE_DIR, 'overlays')
 LOGO_PATH = os.path.join(OVERLAYS_DIR, 'logo.png')
 BANNER_PATH = os.path.join(OVERLAYS_DIR, 'banner.png')
+# The overlay/program name filter graph is handed to FFmpeg in this file
+# (-filter_complex_script) instead of on the command line
+FILTER_SCRIPT_PATH = os.path.join(BASE_DIR, 'filter_complex.txt')
 
 # Overlay Positions
 # Logo: top-left corner with padding
@@ -100,6 +214,9 @@ BANNER_RECOMMENDED_HEIGHT = 150
 MAX_LOGO_SIZE_MB = 5
 MAX_BANNER_SIZE_MB = 10
 
+# Chunk size used when copying uploads (raw bodies and multipart files) to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
 # Allowed image formats
 ALLOWED_OVERLAY_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
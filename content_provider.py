@@ -1,10 +1,44 @@
 import subprocess
-import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import random
 import shutil
 import sys
 import os
 
+# Optional: run yt-dlp in-process instead of spawning it (saves an interpreter
+# start and a full yt-dlp import per call)
+try:
+    from yt_dlp import YoutubeDL
+except ImportError:
+    YoutubeDL = None
+
+# Seconds before a yt-dlp call (search or resolve) is given up on
+YTDLP_TIMEOUT = 30
+
+# Prefer mp4 format with audio+video combined
+STREAM_FORMAT = 'best[ext=mp4]/best'
+
+# In-process yt-dlp calls run here so they can be given up on after
+# YTDLP_TIMEOUT (socket_timeout only bounds each read, not the whole call)
+_ytdlp_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='yt-dlp')
+
+def _extract_info_blocking(options, url):
+    with YoutubeDL(options) as ydl:
+        return ydl.extract_info(url, download=False)
+
+def _extract_info(options, url):
+    """
+    YoutubeDL.extract_info with an overall deadline
+    Raises subprocess.TimeoutExpired like the yt-dlp subprocess path
+    """
+    future = _ytdlp_executor.submit(_extract_info_blocking, options, url)
+    try:
+        return future.result(timeout=YTDLP_TIMEOUT)
+    except FutureTimeoutError:
+        # A running call can't be interrupted; its result is just ignored
+        future.cancel()
+        raise subprocess.TimeoutExpired(['yt-dlp', url], YTDLP_TIMEOUT)
+
 class ContentProvider:
     def __init__(self):
         # Detect yt-dlp path, especially when running in a virtual environment
@@ -31,6 +65,92 @@ class ContentProvider:
         
         self.ytdlp_path = ytdlp_path
 
+    def _ytdlp_cmd(self, *args):
+        """Build a yt-dlp command line (handles both a path and python -m yt_dlp)"""
+        if isinstance(self.ytdlp_path, list):
+            return self.ytdlp_path + list(args)
+        return [self.ytdlp_path, *args]
+
+    def _search(self, search_query):
+        """
+        Run a flat search (no per-video metadata extraction)
+        Returns a list of (video_url, title) tuples
+        """
+        if YoutubeDL is not None:
+            options = {
+                'quiet': True,
+                'no_warnings': True,
+                'extract_flat': True,
+                'playlistend': 10,
+                'socket_timeout': YTDLP_TIMEOUT
+            }
+            info = _extract_info(options, search_query)
+            
+            videos = []
+            for entry in (info or {}).get('entries') or []:
+                video_url = entry.get('url')
+                if not video_url and entry.get('id'):
+                    # Sometimes the url is in id field for YouTube
+                    video_url = f"https://www.youtube.com/watch?v={entry['id']}"
+                if video_url:
+                    videos.append((video_url, entry.get('title') or 'YouTube Video'))
+            return videos
+        
+        # Only the two fields we use, one tab-separated line per result,
+        # instead of a multi-KB JSON object each
+        cmd = self._ytdlp_cmd(
+            '--flat-playlist',
+            '--print', '%(id)s\t%(title)s',
+            '--playlist-end', '10',
+            search_query
+        )
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=YTDLP_TIMEOUT)
+        
+        if result.returncode != 0:
+            print(f"❌ yt-dlp search failed with return code {result.returncode}")
+            print(f"   Error: {result.stderr[:500]}")  # Print first 500 chars of error
+            return []
+        
+        videos = []
+        for line in result.stdout.splitlines():
+            video_id, _, title = line.partition('\t')
+            if video_id and video_id != 'NA':
+                videos.append((f"https://www.youtube.com/watch?v={video_id}", title or 'YouTube Video'))
+        return videos
+
+    def _resolve(self, video_url):
+        """
+        Resolve the direct stream URL for a video
+        Returns the URL, or None if it couldn't be resolved
+        """
+        if YoutubeDL is not None:
+            options = {
+                'quiet': True,
+                'no_warnings': True,
+                'format': STREAM_FORMAT,
+                'socket_timeout': YTDLP_TIMEOUT
+            }
+            info = _extract_info(options, video_url)
+            
+            if not info:
+                return None
+            if info.get('url'):
+                return info['url']
+            # Separate video/audio formats were picked; take the first (video)
+            formats = info.get('requested_formats') or []
+            return formats[0].get('url') if formats else None
+        
+        cmd = self._ytdlp_cmd('-f', STREAM_FORMAT, '-g', video_url)
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=YTDLP_TIMEOUT)
+        
+        if result.returncode != 0:
+            print(f"❌ Failed to resolve stream with return code {result.returncode}")
+            print(f"   Error: {result.stderr[:500]}")
+            return None
+        
+        # Take the first URL (should be a combined stream now)
+        return result.stdout.strip().split('\n')[0] or None
+
     def get_random_video(self, hashtag):
         """
         Fetches a random video URL and title from YouTube for a given hashtag/keyword.
@@ -38,109 +158,39 @@ class ContentProvider:
         """
         if not hashtag:
             return None, None
-
+        
         # Clean hashtag
         search_term = hashtag.replace('#', '')
         
         print(f"Searching YouTube for: {search_term}...")
-
+        
         # Use YouTube search which is much more reliable with yt-dlp
         # ytsearch10: means "search YouTube and get 10 results"
         
         try:
             # Get top 10 search results from YouTube
-            search_query = f"ytsearch10:{search_term}"
-            
-            # Handle both string path and list (for python -m invocation)
-            if isinstance(self.ytdlp_path, list):
-                cmd = self.ytdlp_path + [
-                    '--dump-json',
-                    '--flat-playlist',
-                    '--playlist-end', '10',
-                    search_query
-                ]
-            else:
-                cmd = [
-                    self.ytdlp_path,
-                    '--dump-json',
-                    '--flat-playlist',
-                    '--playlist-end', '10',
-                    search_query
-                ]
-            
-            # Run command with timeout
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=30)
-            
-            if result.returncode != 0:
-                print(f"❌ yt-dlp search failed with return code {result.returncode}")
-                print(f"   Error: {result.stderr[:500]}")  # Print first 500 chars of error
-                return None, None
-
-            videos = []
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    try:
-                        data = json.loads(line)
-                        videos.append(data)
-                    except:
-                        pass
+            videos = self._search(f"ytsearch10:{search_term}")
             
             if not videos:
                 print("❌ No videos found in search results")
                 return None, None
-
+            
             # Pick a random video
             print(f"✓ Found {len(videos)} videos, selecting random one...")
-            selected = random.choice(videos)
-            video_url = selected.get('url')
-            if not video_url:
-                # Sometimes the url is in id field for YouTube
-                video_id = selected.get('id')
-                if video_id:
-                    video_url = f"https://www.youtube.com/watch?v={video_id}"
-                else:
-                    print("❌ Could not extract video URL or ID")
-                    return None, None
-            
-            title = selected.get('title', 'YouTube Video')
+            video_url, title = random.choice(videos)
             
             # Now resolve the direct stream URL for this video
-            # Request a format that has both video and audio combined
             print(f"✓ Resolving stream for: {title}")
+            stream_url = self._resolve(video_url)
             
-            # Use format selection to get a stream with both video and audio
-            # 'best' gives us the best quality with audio+video combined
-            if isinstance(self.ytdlp_path, list):
-                cmd_resolve = self.ytdlp_path + [
-                    '-f', 'best[ext=mp4]/best',  # Prefer mp4 format with audio+video
-                    '-g', 
-                    video_url
-                ]
-            else:
-                cmd_resolve = [
-                    self.ytdlp_path,
-                    '-f', 'best[ext=mp4]/best',  # Prefer mp4 format with audio+video
-                    '-g',
-                    video_url
-                ]
-            
-            result_resolve = subprocess.run(cmd_resolve, capture_output=True, text=True, encoding='utf-8', timeout=30)
-            
-            if result_resolve.returncode != 0:
-                print(f"❌ Failed to resolve stream with return code {result_resolve.returncode}")
-                print(f"   Error: {result_resolve.stderr[:500]}")
+            if not stream_url:
                 return None, None
-                
-            stream_url = result_resolve.stdout.strip()
-            
-            # Take the first URL (should be a combined stream now)
-            stream_url = stream_url.split('\n')[0]
             
             print(f"✓ Successfully resolved stream URL (length: {len(stream_url)} chars)")
             return stream_url, title
-
+        
         except subprocess.TimeoutExpired:
-            print("❌ yt-dlp command timed out after 30 seconds")
+            print(f"❌ yt-dlp command timed out after {YTDLP_TIMEOUT} seconds")
             return None, None
         except Exception as e:
             print(f"❌ Error fetching YouTube video: {type(e).__name__}: {str(e)}")
@@ -0,0 +1,95 @@
+"""
+FFmpeg Output Module
+Stream mapping and muxer arguments that end every FFmpeg command: HLS, or
+HLS plus low-latency DASH through the tee muxer. Kept out of app.py so the
+command tail can be built (and tested) without starting the app
+"""
+
+import os
+import config
+
+
+# HLS output settings. Every segment starts on a keyframe (forced GOP), and is
+# written to a .tmp file then renamed so readers never see a partial one
+HLS_FLAGS = 'delete_segments+append_list+program_date_time+independent_segments+temp_file'
+HLS_OPTIONS = [
+    ('hls_time', str(config.HLS_SEGMENT_DURATION)),
+    ('hls_list_size', str(config.HLS_PLAYLIST_SIZE)),
+    ('hls_flags', HLS_FLAGS),
+    ('hls_segment_type', config.HLS_SEGMENT_TYPE)
+]
+if config.HLS_SEGMENT_TYPE == 'fmp4':
+    # fMP4 segments share one init segment
+    HLS_OPTIONS.append(('hls_fmp4_init_filename', config.HLS_FMP4_INIT_FILENAME))
+HLS_OPTIONS += [
+    ('hls_segment_filename', os.path.join(config.HLS_DIR, f'segment%05d{config.HLS_SEGMENT_EXTENSION}')),
+    ('start_number', '0')
+]
+
+# Low-latency DASH next to HLS (DASH_ENABLED)
+DASH_OPTIONS = [
+    ('seg_duration', str(config.HLS_SEGMENT_DURATION)),
+    ('window_size', str(config.HLS_PLAYLIST_SIZE)),
+    ('use_template', '1'),
+    ('use_timeline', '1'),
+    ('streaming', '1'),
+    ('ldash', '1')
+]
+
+# Characters the tee muxer treats as syntax: option values are split on
+# ':' and ']', and the whole output list on '|'
+TEE_OPTION_SPECIALS = "\\':]"
+TEE_OUTPUT_SPECIALS = "\\'|"
+
+def tee_escape(value, specials):
+    """Backslash-escape the characters in `specials`"""
+    return ''.join('\\' + ch if ch in specials else ch for ch in value)
+
+def tee_output(options, path):
+    """One tee muxer output: [key=value:...]path, escaped for both parsing passes"""
+    option_str = ':'.join(f"{key}={tee_escape(value, TEE_OPTION_SPECIALS)}" for key, value in options)
+    return tee_escape(f"[{option_str}]{path}", TEE_OUTPUT_SPECIALS)
+
+def build_muxer_args(dash_enabled):
+    """
+    Muxer flags plus the HLS output, or with `dash_enabled` one encode
+    written by two muxers (HLS as usual plus low-latency DASH) through tee
+    """
+    # Muxer latency: don't hold packets back in the muxer, flush each one as it's written
+    mux_flags = '+low_delay'
+    if dash_enabled:
+        # The tee muxer can't tell the encoders that the DASH (MP4) output needs
+        # codec headers out of band, so ask for them explicitly
+        mux_flags += '+global_header'
+
+    mux_args = (
+        '-flags', mux_flags, '-fflags', '+nobuffer+flush_packets',
+        '-max_delay', '0', '-muxdelay', '0', '-muxpreload', '0'
+    )
+
+    if dash_enabled:
+        return (
+            *mux_args,
+            '-f', 'tee',
+            tee_output([('f', 'hls'), *HLS_OPTIONS], config.HLS_PLAYLIST) + '|'
+            + tee_output([('f', 'dash'), *DASH_OPTIONS], config.DASH_MANIFEST)
+        )
+    return (
+        *mux_args,
+        '-f', 'hls',
+        *(arg for key, value in HLS_OPTIONS for arg in (f'-{key}', value)),
+        config.HLS_PLAYLIST
+    )
+
+# Built once at import instead of on every source switch
+FFMPEG_MUXER_ARGS = build_muxer_args(config.DASH_ENABLED)
+
+def build_output_args(video, audio, muxer_args=FFMPEG_MUXER_ARGS):
+    """
+    Everything after the codec/filter options: the streams to write, then the muxer
+    The tee muxer has no default stream selection ("Output file does not
+    contain any stream" without -map), so the streams are always mapped:
+    `video` is an input stream or a filter graph label such as "[out]",
+    `audio` an input stream specifier (trailing '?' if it may be missing)
+    """
+    return ('-map', video, '-map', audio, *muxer_args)
@@ -0,0 +1,73 @@
+"""
+HLS Server Module
+Viewer-facing /live/ routes (playlists and segments), kept apart from the
+control API so they can be served by a separate process/port
+Run standalone with: python hls_server.py (or gunicorn hls_server:hls_app)
+"""
+
+from flask import Blueprint, Flask, Response, request, send_from_directory, abort
+from flask_cors import CORS
+from werkzeug.security import safe_join
+import config
+
+
+hls_bp = Blueprint('hls', __name__)
+
+def send_hls_file(filename):
+    """
+    Serve a file from the HLS directory
+    With HLS_X_ACCEL_PREFIX set, nginx sends the file itself (sendfile) and
+    Python only returns the X-Accel-Redirect header
+    """
+    if config.HLS_X_ACCEL_PREFIX:
+        if safe_join(config.HLS_DIR, filename) is None:
+            abort(404)
+        response = Response()
+        response.headers['X-Accel-Redirect'] = config.HLS_X_ACCEL_PREFIX.rstrip('/') + '/' + filename
+        return response
+    return send_from_directory(config.HLS_DIR, filename)
+
+@hls_bp.route('/live/<username>/stream.m3u8')
+def user_stream_playlist(username):
+    """Serve the main playlist under a user-specific URL"""
+    # We ignore the username for now and serve the same stream
+    # This creates the illusion of a unique link
+    return send_hls_file('stream.m3u8')
+
+@hls_bp.route('/live/<username>/playlist.m3u')
+def user_stream_playlist_m3u(username):
+    """Serve a Master Playlist (M3U) for IPTV players"""
+    host = request.host_url.rstrip('/')
+    stream_url = f"{host}/live/{username}/stream.m3u8"
+    logo_url = "https://seeklogo.com/images/T/tv-logo-F7231DA292-seeklogo.com.png"
+    
+    # M3U content with logo
+    content = f"""#EXTM3U
+#EXTINF:-1 tvg-id="sinlive" tvg-name="SinLive" tvg-logo="{logo_url}" group-title="Live",SinLive Stream
+{stream_url}"""
+
+    return Response(content, mimetype='text/plain')
+
+@hls_bp.route('/live/<username>/<path:filename>')
+def user_stream_segment(username, filename):
+    """Serve HLS segments under a user-specific URL"""
+    return send_hls_file(filename)
+
+def create_hls_app() -> Flask:
+    """Create a minimal app that only serves the /live/ routes"""
+    hls_app = Flask(__name__)
+    CORS(hls_app)
+    hls_app.use_x_sendfile = config.USE_X_SENDFILE
+    hls_app.register_blueprint(hls_bp)
+    return hls_app
+
+hls_app = create_hls_app()
+
+if __name__ == '__main__':
+    try:
+        from waitress import serve
+    except ImportError:
+        hls_app.run(host=config.SERVER_HOST, port=config.HLS_SERVER_PORT, debug=False)
+    else:
+        print(f"Serving /live/ on http://{config.SERVER_HOST}:{config.HLS_SERVER_PORT}")
+        serve(hls_app, host=config.SERVER_HOST, port=config.HLS_SERVER_PORT, threads=config.SERVER_THREADS)
@@ -5,6 +5,8 @@ Handles logo watermark and banner overlays for HLS stream
 
 import os
 import shutil
+import subprocess
+import threading
 from typing import Optional, Dict, Any, Tuple
 from PIL import Image, ImageOps
 import config
@@ -23,6 +25,34 @@ class OverlayManager:
         # Track overlay status
         self._logo_exists = os.path.exists(config.LOGO_PATH)
         self._banner_exists = os.path.exists(config.BANNER_PATH)
+        
+        # Bumped whenever an overlay file is saved or deleted, so callers can
+        # tell whether filters/inputs built earlier are still valid. Uploads
+        # run on request threads, so the increment is done under a lock
+        self._version = 0
+        self._version_lock = threading.Lock()
+        
+        # Last FFmpeg inputs/filter built, keyed by the version and the enable
+        # flags: (key, inputs, filter). Rebuilt only after a save/delete/toggle
+        self._args_cache = None
+        
+        # path -> (mtime_ns, file_size, (width, height)), so get_status only
+        # stats the overlay files instead of opening them on every call
+        self._image_info = {}
+    
+    def get_version(self) -> int:
+        """Get the overlay file version (changes on every save/delete)"""
+        return self._version
+    
+    def _bump_version(self):
+        with self._version_lock:
+            self._version += 1
+    
+    def refresh(self):
+        """Re-check the overlay files after they were changed outside this class"""
+        self._logo_exists = os.path.exists(config.LOGO_PATH)
+        self._banner_exists = os.path.exists(config.BANNER_PATH)
+        self._bump_version()
     
     def validate_image(self, file_path: str, max_size_mb: int) -> Tuple[bool, str]:
         """
@@ -39,10 +69,15 @@ class OverlayManager:
             if file_size_mb > max_size_mb:
                 return False, f"File too large ({file_size_mb:.1f}MB). Max: {max_size_mb}MB"
             
-            # Check if valid image
+            # Check if valid image. Only the header is parsed here: the
+            # caller decodes the whole image right after anyway, and a
+            # corrupt file fails there, so a separate verify() pass over
+            # every chunk would just read it twice
             try:
-                img = Image.open(file_path)
-                img.verify()
+                with Image.open(file_path) as img:
+                    width, height = img.size
+                if not width or not height:
+                    return False, "Invalid image file: empty image"
             except Exception as e:
                 return False, f"Invalid image file: {str(e)}"
             
@@ -72,21 +107,12 @@ class OverlayManager:
             target_width = int(config.STREAM_WIDTH * 0.10)
             target_height = int(config.STREAM_HEIGHT * 0.10)
             
-            # Process image
-            img = Image.open(source_path)
-            
-            # Convert to RGBA for transparency
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Resize and crop to fit exactly 10% box
-            # ImageOps.fit resizes and crops to center
-            img = ImageOps.fit(img, (target_width, target_height), method=Image.Resampling.LANCZOS)
-            
-            # Save
-            img.save(config.LOGO_PATH, 'PNG')
+            # Resize and crop to fill the box exactly, then save as RGBA PNG
+            self._fit_image(source_path, config.LOGO_PATH, (target_width, target_height))
+            self._remember_size(config.LOGO_PATH, (target_width, target_height))
             
             self._logo_exists = True
+            self._bump_version()
             
             image_info = {
                 'width': target_width,
@@ -118,20 +144,12 @@ class OverlayManager:
             target_width = config.STREAM_WIDTH
             target_height = config.BANNER_RECOMMENDED_HEIGHT
             
-            # Process image
-            img = Image.open(source_path)
-            
-            # Convert to RGBA
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Resize and crop
-            img = ImageOps.fit(img, (target_width, target_height), method=Image.Resampling.LANCZOS)
-            
-            # Save
-            img.save(config.BANNER_PATH, 'PNG')
+            # Resize and crop to fill the box exactly, then save as RGBA PNG
+            self._fit_image(source_path, config.BANNER_PATH, (target_width, target_height))
+            self._remember_size(config.BANNER_PATH, (target_width, target_height))
             
             self._banner_exists = True
+            self._bump_version()
             
             image_info = {
                 'width': target_width,
@@ -147,12 +165,52 @@ class OverlayManager:
         except Exception as e:
             return False, f"Error saving banner: {str(e)}", None
     
+    def _fit_image(self, source_path: str, dest_path: str, size: Tuple[int, int]):
+        """
+        Scale an image to cover `size`, center-crop it to exactly `size` and
+        save it as an RGBA PNG (what ImageOps.fit does)
+        Uses FFmpeg's SIMD lanczos scaler; falls back to PIL if FFmpeg fails
+        """
+        width, height = size
+        cmd = [
+            config.FFMPEG_EXECUTABLE, '-y', '-hide_banner', '-v', 'error',
+            '-i', source_path,
+            '-vf', (
+                f"scale={width}:{height}:force_original_aspect_ratio=increase:flags=lanczos,"
+                f"crop={width}:{height},format=rgba"
+            ),
+            '-frames:v', '1', '-update', '1', '-f', 'image2', '-c:v', 'png',
+            dest_path
+        ]
+        try:
+            result = subprocess.run(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                capture_output=True, text=True, timeout=30,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            if result.returncode == 0:
+                return
+            print(f"FFmpeg resize failed, using PIL: {result.stderr.strip()[-200:]}")
+        except Exception as e:
+            print(f"FFmpeg resize unavailable, using PIL: {e}")
+        
+        with Image.open(source_path) as img:
+            # Convert to RGBA for transparency
+            if img.mode != 'RGBA':
+                img = img.convert('RGBA')
+            
+            # ImageOps.fit resizes and crops to center
+            img = ImageOps.fit(img, size, method=Image.Resampling.LANCZOS)
+            img.save(dest_path, 'PNG')
+    
     def delete_logo(self) -> bool:
         """Delete logo file"""
         try:
             if os.path.exists(config.LOGO_PATH):
                 os.remove(config.LOGO_PATH)
             self._logo_exists = False
+            self._bump_version()
             return True
         except Exception as e:
             print(f"Error deleting logo: {e}")
@@ -164,104 +222,155 @@ class OverlayManager:
             if os.path.exists(config.BANNER_PATH):
                 os.remove(config.BANNER_PATH)
             self._banner_exists = False
+            self._bump_version()
             return True
         except Exception as e:
             print(f"Error deleting banner: {e}")
             return False
     
-    def get_ffmpeg_overlay_filter(self) -> Optional[str]:
+    def get_overlay_args(self, cuda: bool = False) -> Tuple[list, Optional[str]]:
         """
-        Generate FFmpeg filter_complex for overlays
-        Returns None if no overlays are enabled/available
+        Get overlay input files and filter for FFmpeg
+        With `cuda`, the graph composites on the GPU (overlay_cuda) for NVENC
+        Reuses the previous result while no overlay was saved, deleted or toggled
+        Returns: (inputs, filter)
         """
-        if not config.OVERLAY_ENABLED:
-            return None
+        key = (self._version, config.OVERLAY_ENABLED, config.LOGO_ENABLED, config.BANNER_ENABLED, cuda)
+        
+        cached = self._args_cache
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
         
         # Check which overlays are available and enabled
         logo_ready = config.LOGO_ENABLED and os.path.exists(config.LOGO_PATH)
         banner_ready = config.BANNER_ENABLED and os.path.exists(config.BANNER_PATH)
         
-        if not logo_ready and not banner_ready:
-            return None
+        # The inputs are only useful with the filter that maps them; on their
+        # own FFmpeg could even pick an overlay image as the video stream
+        inputs = []
+        overlay_filter = None
+        if config.OVERLAY_ENABLED:
+            inputs = self._build_overlay_inputs(logo_ready, banner_ready)
+            if cuda:
+                overlay_filter = self._build_cuda_overlay_filter(logo_ready, banner_ready)
+            else:
+                overlay_filter = self._build_overlay_filter(logo_ready, banner_ready)
         
-        # Build filter complex
+        self._args_cache = (key, inputs, overlay_filter)
+        return inputs, overlay_filter
+    
+    def get_ffmpeg_overlay_filter(self) -> Optional[str]:
+        """
+        Generate FFmpeg filter_complex for overlays
+        Returns None if no overlays are enabled/available
+        """
+        return self.get_overlay_args()[1]
+    
+    def get_overlay_inputs(self) -> list:
+        """
+        Get list of overlay input files for FFmpeg
+        Returns list of file paths in order: [logo, banner]
+        """
+        return self.get_overlay_args()[0]
+    
+    def _build_overlay_filter(self, logo_ready: bool, banner_ready: bool) -> Optional[str]:
+        """Build the overlay filter_complex for the overlays that are ready"""
         # Input [0:v] is the main video stream
         # Input [1:v] is logo (if exists)
         # Input [2:v] is banner (if exists)
         
         if logo_ready and banner_ready:
             # Both logo and banner
-            filter_complex = (
+            return (
                 f"[0:v][1:v]overlay={config.LOGO_POSITION_X}:{config.LOGO_POSITION_Y}[tmp];"
                 f"[tmp][2:v]overlay={config.BANNER_POSITION_X}:H-h-{config.BANNER_POSITION_Y_OFFSET}[out]"
             )
-            return filter_complex
         elif logo_ready:
             # Only logo
-            filter_complex = (
-                f"[0:v][1:v]overlay={config.LOGO_POSITION_X}:{config.LOGO_POSITION_Y}[out]"
-            )
-            return filter_complex
+            return f"[0:v][1:v]overlay={config.LOGO_POSITION_X}:{config.LOGO_POSITION_Y}[out]"
         elif banner_ready:
             # Only banner
-            filter_complex = (
-                f"[0:v][1:v]overlay={config.BANNER_POSITION_X}:H-h-{config.BANNER_POSITION_Y_OFFSET}[out]"
-            )
-            return filter_complex
+            return f"[0:v][1:v]overlay={config.BANNER_POSITION_X}:H-h-{config.BANNER_POSITION_Y_OFFSET}[out]"
         
         return None
     
-    def get_overlay_inputs(self) -> list:
+    def _build_cuda_overlay_filter(self, logo_ready: bool, banner_ready: bool) -> Optional[str]:
         """
-        Get list of overlay input files for FFmpeg
-        Returns list of file paths in order: [logo, banner]
+        GPU version of _build_overlay_filter: every input is uploaded to the
+        filter CUDA device (frames from the CUDA decoder pass straight through)
+        and composited with overlay_cuda, so the frames never leave VRAM
+        (overlay_cuda takes x/y expressions from FFmpeg 6.0)
         """
+        positions = []
+        if logo_ready:
+            positions.append(f"x={config.LOGO_POSITION_X}:y={config.LOGO_POSITION_Y}")
+        if banner_ready:
+            positions.append(f"x={config.BANNER_POSITION_X}:y=H-h-{config.BANNER_POSITION_Y_OFFSET}")
+        
+        if not positions:
+            return None
+        
+        parts = ["[0:v]format=nv12|cuda,hwupload[base0]"]
+        for index, position in enumerate(positions, start=1):
+            parts.append(f"[{index}:v]format=yuva420p,hwupload[ov{index}]")
+            output = "[out]" if index == len(positions) else f"[base{index}]"
+            parts.append(f"[base{index - 1}][ov{index}]overlay_cuda={position}{output}")
+        
+        return ";".join(parts)
+    
+    def _build_overlay_inputs(self, logo_ready: bool, banner_ready: bool) -> list:
+        """List the overlay files to pass as FFmpeg inputs, in filter order"""
         inputs = []
         
-        if config.LOGO_ENABLED and os.path.exists(config.LOGO_PATH):
+        if logo_ready:
             inputs.append(config.LOGO_PATH)
         
-        if config.BANNER_ENABLED and os.path.exists(config.BANNER_PATH):
+        if banner_ready:
             inputs.append(config.BANNER_PATH)
         
         return inputs
     
-    def get_status(self) -> Dict[str, Any]:
-        """Get current overlay status"""
-        logo_info = None
-        banner_info = None
+    def _remember_size(self, path: str, size: Tuple[int, int]):
+        """Cache the dimensions of an overlay file just written"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._image_info[path] = (st.st_mtime_ns, st.st_size, size)
+    
+    def _get_image_info(self, path: str, enabled: bool) -> Dict[str, Any]:
+        """
+        Describe one overlay file for get_status
+        The image is only opened when the file changed since it was last seen
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {'exists': False, 'enabled': enabled}
         
-        # Get logo info
-        if os.path.exists(config.LOGO_PATH):
-            try:
-                img = Image.open(config.LOGO_PATH)
-                logo_info = {
-                    'exists': True,
-                    'width': img.size[0],
-                    'height': img.size[1],
-                    'size_mb': round(os.path.getsize(config.LOGO_PATH) / (1024 * 1024), 2),
-                    'enabled': config.LOGO_ENABLED
-                }
-            except:
-                logo_info = {'exists': False, 'enabled': config.LOGO_ENABLED}
+        cached = self._image_info.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            size = cached[2]
         else:
-            logo_info = {'exists': False, 'enabled': config.LOGO_ENABLED}
-        
-        # Get banner info
-        if os.path.exists(config.BANNER_PATH):
             try:
-                img = Image.open(config.BANNER_PATH)
-                banner_info = {
-                    'exists': True,
-                    'width': img.size[0],
-                    'height': img.size[1],
-                    'size_mb': round(os.path.getsize(config.BANNER_PATH) / (1024 * 1024), 2),
-                    'enabled': config.BANNER_ENABLED
-                }
-            except:
-                banner_info = {'exists': False, 'enabled': config.BANNER_ENABLED}
-        else:
-            banner_info = {'exists': False, 'enabled': config.BANNER_ENABLED}
+                with Image.open(path) as img:
+                    size = img.size
+            except Exception:
+                return {'exists': False, 'enabled': enabled}
+            self._image_info[path] = (st.st_mtime_ns, st.st_size, size)
+        
+        return {
+            'exists': True,
+            'width': size[0],
+            'height': size[1],
+            'size_mb': round(st.st_size / (1024 * 1024), 2),
+            'enabled': enabled
+        }
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get current overlay status"""
+        logo_info = self._get_image_info(config.LOGO_PATH, config.LOGO_ENABLED)
+        banner_info = self._get_image_info(config.BANNER_PATH, config.BANNER_ENABLED)
         
         return {
             'overlay_enabled': config.OVERLAY_ENABLED,
@@ -0,0 +1,174 @@
+"""
+Script to add the overlay and Program Info controls to index.html in one go
+Produces the same result as running add_overlay_ui.py followed by
+add_program_ui.py, but reads, splices and writes the template only once
+
+Run with --check to verify index.html without touching it: exits 0 if the
+controls are already present, otherwise prints the diff and exits 1
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import mmap
+import os
+import sys
+from pathlib import Path
+
+from add_overlay_ui import OVERLAY_SENTINELS, render_overlay_html
+from add_program_ui import PROGRAM_SENTINELS
+from template_patch import IO_BUFFER_SIZE, find_sentinels, splice_all
+
+TEMPLATE_PATH = 'templates/index.html'
+SNIPPETS_DIR = Path(__file__).resolve().parent / 'snippets'
+
+# Sidecar remembering the last template this script looked at (fingerprint,
+# whether it was already patched) so an unchanged template can be handled
+# without scanning it again
+STATE_PATH = Path(__file__).resolve().parent / '.patch_state.json'
+
+# Bytes hashed from each end of the template for the fingerprint
+FINGERPRINT_SAMPLE = 4096
+
+# Insertion points
+queue_marker = b'                <!-- Queue -->'
+overlay_marker = b'<!-- Overlay Controls -->'
+script_end_marker = b'    </script>'
+
+# Strings that only exist once the corresponding blocks (HTML and JavaScript
+# of each set of controls) have been inserted
+SENTINELS = OVERLAY_SENTINELS + PROGRAM_SENTINELS
+
+
+def load_snippet(name: str) -> bytes:
+    """Load an HTML/JS block from snippets/ as raw bytes"""
+    return (SNIPPETS_DIR / name).read_bytes()
+
+
+def template_fingerprint(data, st: os.stat_result) -> dict:
+    """
+    Cheap identity for the template: mtime, size and a hash of its first and
+    last few KB, so an unchanged file is recognised in O(1)
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(data[:FINGERPRINT_SAMPLE])
+    digest.update(data[-FINGERPRINT_SAMPLE:])
+    return {
+        'mtime_ns': st.st_mtime_ns,
+        'size': st.st_size,
+        'digest': digest.hexdigest()
+    }
+
+
+def load_state() -> dict:
+    """Load the sidecar state, or an empty dict if missing/unreadable"""
+    try:
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    """Persist the sidecar state; failure only costs a rescan next time"""
+    try:
+        with open(STATE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+    except OSError as e:
+        print(f"Warning: could not save {STATE_PATH.name}: {e}")
+
+
+def print_diff(old: bytes, new: bytes):
+    """Print a unified diff of the template before/after patching"""
+    diff = difflib.unified_diff(
+        old.decode('utf-8', 'replace').splitlines(keepends=True),
+        new.decode('utf-8', 'replace').splitlines(keepends=True),
+        fromfile=TEMPLATE_PATH,
+        tofile=f'{TEMPLATE_PATH} (patched)'
+    )
+    sys.stdout.writelines(diff)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Add the overlay and Program Info controls to index.html')
+    parser.add_argument('--check', action='store_true',
+                        help='only report whether index.html needs patching (prints a diff, writes nothing)')
+    args = parser.parse_args(argv)
+
+    overlay_html = render_overlay_html()
+    overlay_js = load_snippet('overlay_controls.js')
+    program_html = load_snippet('program_info.html')
+    program_js = load_snippet('program_info.js')
+
+    # Program Info sits directly in front of the Overlay Controls section, so
+    # fold it into the overlay block up front (a few KB, not the whole file)
+    controls_html = overlay_html.replace(overlay_marker, program_html + b'\n\n' + overlay_marker, 1)
+
+    splices = [
+        (queue_marker, controls_html),
+        (script_end_marker, overlay_js + program_js),
+    ]
+
+    markers = [marker for marker, _ in splices]
+    state = load_state()
+
+    with open(TEMPLATE_PATH, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        fingerprint = template_fingerprint(mm, os.fstat(f.fileno()))
+
+        if state.get('fingerprint') == fingerprint:
+            # Same template as last run: the outcome can't have changed
+            if state.get('patched'):
+                print("✓ Overlay and Program Info controls already present in index.html, nothing to do")
+                return 0
+            print("✗ index.html is unchanged since the last run, which couldn't find its insertion markers")
+            return 1
+
+        found = find_sentinels(mm, SENTINELS)
+
+        if len(found) == len(SENTINELS):
+            if not args.check:
+                save_state({'fingerprint': fingerprint, 'patched': True})
+            print("✓ Overlay and Program Info controls already present in index.html, nothing to do")
+            return 0
+        if found:
+            print("✗ index.html is only partially patched, fix it by hand")
+            return 1
+
+        content = bytearray(mm)
+        offsets = splice_all(content, splices)
+
+        if len(offsets) != len(markers):
+            # All blocks or none: a half-patched file couldn't be recognised
+            # (and would get a second copy of the other block) on the next run
+            if queue_marker not in offsets:
+                print("✗ Could not find Queue marker")
+            if script_end_marker not in offsets:
+                print("✗ Could not find script end marker")
+            print("✗ index.html left unchanged")
+            if not args.check:
+                save_state({'fingerprint': fingerprint, 'patched': False})
+            return 1
+
+        if args.check:
+            print_diff(mm[:], bytes(content))
+            return 1
+
+    print("✓ Inserted overlay and Program Info HTML controls")
+    print("✓ Inserted overlay and Program Info JavaScript")
+
+    with open(TEMPLATE_PATH, 'wb', buffering=IO_BUFFER_SIZE) as f:
+        f.write(content)
+        f.flush()
+        save_state({
+            'fingerprint': template_fingerprint(content, os.fstat(f.fileno())),
+            'patched': True
+        })
+
+    print("\n✅ Done! Overlay and Program Info controls added to index.html")
+    print("Restart the Flask server and refresh your browser.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
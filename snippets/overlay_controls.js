@@ -0,0 +1,89 @@
+
+        // Overlay Upload Handling (one handler, bound once per overlay slot)
+        function bindUpload(cfg) {
+            document.getElementById(cfg.formId).addEventListener('submit', function (e) {
+                e.preventDefault();
+                const fileInput = document.getElementById(cfg.inputId);
+                const file = fileInput.files[0];
+                if (!file) return;
+                
+                const statusDiv = document.getElementById(cfg.statusId);
+                
+                statusDiv.textContent = `Uploading ${cfg.label}...`;
+                statusDiv.style.color = "#ffc107";
+                
+                // Send the file itself as the request body: the browser streams it
+                // from disk instead of building a multipart body in memory
+                fetch(`${cfg.endpoint}?name=${encodeURIComponent(file.name)}`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': file.type || 'application/octet-stream' },
+                    body: file
+                })
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.success) {
+                            statusDiv.textContent = `✓ ${data.message} (${data.info.width}x${data.info.height})`;
+                            statusDiv.style.color = "#28a745";
+                            fileInput.value = '';
+                            updateOverlayStatus();
+                            setTimeout(() => statusDiv.textContent = '', 5000);
+                        } else {
+                            statusDiv.textContent = `✗ ${data.error}`;
+                            statusDiv.style.color = "#dc3545";
+                        }
+                    })
+                    .catch(err => {
+                        statusDiv.textContent = "✗ Upload Failed";
+                        statusDiv.style.color = "#dc3545";
+                    });
+            });
+        }
+
+        bindUpload({ formId: 'logo-upload-form', inputId: 'logoInput', endpoint: '/upload_logo', statusId: 'logo-status', label: 'logo' });
+        bindUpload({ formId: 'banner-upload-form', inputId: 'bannerInput', endpoint: '/upload_banner', statusId: 'banner-status', label: 'banner' });
+
+        // Render Overlay Status; skipped when the payload is unchanged so
+        // repeated identical updates don't rebuild the DOM
+        let lastOverlayStatus = '';
+        function renderOverlay(payload) {
+            if (payload === lastOverlayStatus) return;
+            lastOverlayStatus = payload;
+            
+            const data = JSON.parse(payload);
+            const infoDiv = document.getElementById('overlay-info');
+            let html = '';
+            
+            if (data.logo.exists) {
+                html += `<div style="margin-bottom: 8px;">
+                    <span style="color: #28a745;">✓</span> Logo: ${data.logo.width}x${data.logo.height} (${data.logo.size_mb}MB)
+                </div>`;
+            } else {
+                html += `<div style="margin-bottom: 8px; color: #6c757d;">○ Logo: Not uploaded</div>`;
+            }
+            
+            if (data.banner.exists) {
+                html += `<div>
+                    <span style="color: #28a745;">✓</span> Banner: ${data.banner.width}x${data.banner.height} (${data.banner.size_mb}MB)
+                </div>`;
+            } else {
+                html += `<div style="color: #6c757d;">○ Banner: Not uploaded</div>`;
+            }
+            
+            infoDiv.innerHTML = html;
+        }
+
+        // Update Overlay Status. cache: 'no-cache' revalidates with the
+        // response's ETag, so an unchanged status costs an empty 304
+        function updateOverlayStatus() {
+            fetch('/overlay_status', { cache: 'no-cache' })
+                .then(response => response.text())
+                .then(text => renderOverlay(text.trim()))
+                .catch(err => {
+                    console.error('Error fetching overlay status:', err);
+                });
+        }
+
+        // Update overlay status periodically
+        setInterval(updateOverlayStatus, 5000);
+        updateOverlayStatus();
+
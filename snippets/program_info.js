@@ -0,0 +1,32 @@
+
+        // Program Name Handling
+        function updateProgramName() {
+            const name = document.getElementById('programNameInput').value;
+            const statusDiv = document.getElementById('program-status');
+            
+            statusDiv.textContent = "Updating...";
+            statusDiv.style.color = "#ffc107";
+            
+            fetch('/set_program_name', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ program_name: name })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    statusDiv.textContent = "✓ Updated (Restart stream to apply)";
+                    statusDiv.style.color = "#28a745";
+                    setTimeout(() => statusDiv.textContent = '', 5000);
+                } else {
+                    statusDiv.textContent = "✗ Failed";
+                    statusDiv.style.color = "#dc3545";
+                }
+            })
+            .catch(err => {
+                statusDiv.textContent = "✗ Error";
+                statusDiv.style.color = "#dc3545";
+            });
+        }
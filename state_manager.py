@@ -5,32 +5,84 @@ Provides thread-safe state management for the TV Playout system
 
 import threading
 import json
+import logging
 import os
+import sys
 import time
+from collections import deque
+from itertools import islice
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple, Iterable
 import config
 
+# Optional: orjson for faster metadata serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dump_json(obj, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, with orjson when it's available"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+
+def load_json(data: bytes):
+    """Parse UTF-8 JSON bytes, with orjson when it's available"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+# Segment statuses. Interned so statuses loaded from the metadata file share
+# one string object each and comparisons are mostly identity checks
+STATUS_ACTIVE, STATUS_ARCHIVED, STATUS_DELETED = map(sys.intern, ('active', 'archived', 'deleted'))
+
 
 class StateManager:
     """
     Centralized, thread-safe state management for the application
+    
+    Writes always go through the lock. Getters that return a single attribute
+    (is_broadcasting, get_program_name, ...) read it without the lock: an
+    attribute load is atomic in CPython, so they see either the old or the new
+    value. Anything that needs several fields to agree (get_mode,
+    get_full_state, ...) still takes the lock.
     """
     
     def __init__(self):
-        self._lock = threading.RLock()
+        # Plain Lock, not RLock: no method calls another locked method
+        self._lock = threading.Lock()
+        
+        # Signalled whenever something the stream manager loop reacts to changes;
+        # shares the state lock so waiters see a consistent snapshot
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        
+        # (monotonic time, state) of the last get_full_state result, reused by
+        # pollers for FULL_STATE_CACHE_TTL seconds; cleared by every setter
+        # that changes something in it
+        self._full_state_cache = None
         
         # Broadcast state
         self._is_broadcasting = False
         self._is_live_camera_mode = False
         
-        # Playlist queue
-        self._playlist_queue = []
+        # Playlist queue (deque: popping the next item is O(1))
+        self._playlist_queue = deque()
+        # Immutable copy of the queue, replaced on every change, so readers
+        # get it without the lock
+        self._queue_snapshot = ()
         
         # Current playback info
         self._current_source_type = None  # 'QUEUE', 'IDLE', 'LIVE', None
         self._current_playing_file = None
-        self._current_video_start_time = None  # When current video started playing
+        # When the current video started playing: time.monotonic() for
+        # measuring elapsed time, plus the wall-clock time for display
+        self._current_video_start_time = None
+        self._current_video_started_at = None
         self._current_video_duration = None  # Duration of current video
         
         # Process management
@@ -51,78 +103,129 @@ class StateManager:
 
     def set_program_name(self, name: str):
         with self._lock:
+            self._full_state_cache = None
             self._program_name = name
             
     def get_program_name(self) -> str:
-        with self._lock:
-            return self._program_name
+        return self._program_name
 
     # --- Auto Mode State ---
 
     def set_auto_mode(self, enabled: bool):
         with self._lock:
+            self._full_state_cache = None
             self._auto_mode_enabled = enabled
+            self._notify_change()
             
     def is_auto_mode(self) -> bool:
-        with self._lock:
-            return self._auto_mode_enabled
+        return self._auto_mode_enabled
             
     def set_current_hashtag(self, hashtag: str):
         with self._lock:
+            self._full_state_cache = None
             self._current_hashtag = hashtag
             
     def get_current_hashtag(self) -> str:
-        with self._lock:
-            return self._current_hashtag
+        return self._current_hashtag
 
     
+    # --- Change Notification ---
+    
+    def _notify_change(self):
+        """Wake up threads blocked in wait_for_change (caller holds the lock)"""
+        self._version += 1
+        self._changed.notify_all()
+    
+    def notify_change(self):
+        """Signal a change that isn't made through a setter (e.g. FFmpeg exiting)"""
+        with self._lock:
+            self._notify_change()
+    
+    def get_version(self) -> int:
+        with self._lock:
+            return self._version
+    
+    def wait_for_change(self, version: int, timeout: float = None) -> bool:
+        """
+        Block until the state has changed since `version` was read, or timeout
+        Returns: True if a change happened
+        """
+        with self._lock:
+            return self._changed.wait_for(lambda: self._version != version, timeout)
+    
     # --- Broadcasting State ---
     
     def set_broadcasting(self, is_broadcasting: bool):
         with self._lock:
+            self._full_state_cache = None
             self._is_broadcasting = is_broadcasting
             if is_broadcasting and self._stream_start_time is None:
-                self._stream_start_time = time.time()
+                self._stream_start_time = time.monotonic()
+            self._notify_change()
     
     def is_broadcasting(self) -> bool:
-        with self._lock:
-            return self._is_broadcasting
+        return self._is_broadcasting
     
     def set_live_camera_mode(self, is_live: bool):
         with self._lock:
+            self._full_state_cache = None
             self._is_live_camera_mode = is_live
+            self._notify_change()
     
     def is_live_camera_mode(self) -> bool:
+        return self._is_live_camera_mode
+    
+    def set_mode(self, is_broadcasting: bool, is_live: bool):
+        """Set broadcasting and live camera mode together, as one change"""
+        with self._lock:
+            self._full_state_cache = None
+            self._is_broadcasting = is_broadcasting
+            self._is_live_camera_mode = is_live
+            if is_broadcasting and self._stream_start_time is None:
+                self._stream_start_time = time.monotonic()
+            self._notify_change()
+    
+    def get_mode(self) -> Tuple[bool, bool]:
+        """
+        Read both mode flags in one go
+        Returns: (is_broadcasting, is_live_camera_mode)
+        """
         with self._lock:
-            return self._is_live_camera_mode
+            return self._is_broadcasting, self._is_live_camera_mode
     
     # --- Playlist Queue ---
     
     def add_to_queue(self, filename: str):
         with self._lock:
+            self._full_state_cache = None
             self._playlist_queue.append(filename)
+            self._queue_snapshot = tuple(self._playlist_queue)
+            self._notify_change()
     
     def pop_from_queue(self) -> Optional[str]:
         with self._lock:
-            if len(self._playlist_queue) > 0:
-                return self._playlist_queue.pop(0)
+            if self._playlist_queue:
+                self._full_state_cache = None
+                filename = self._playlist_queue.popleft()
+                self._queue_snapshot = tuple(self._playlist_queue)
+                return filename
             return None
     
     def get_queue(self) -> List[str]:
-        with self._lock:
-            return self._playlist_queue.copy()
+        return list(self._queue_snapshot)
     
     def queue_length(self) -> int:
-        with self._lock:
-            return len(self._playlist_queue)
+        return len(self._queue_snapshot)
     
     # --- Current Playback ---
     
     def set_current_playback(self, source_type: str, playing_file: str, duration: float = None):
         with self._lock:
+            self._full_state_cache = None
             self._current_source_type = source_type
             self._current_playing_file = playing_file
-            self._current_video_start_time = time.time()
+            self._current_video_start_time = time.monotonic()
+            self._current_video_started_at = time.time()
             self._current_video_duration = duration
             
             if source_type == 'QUEUE':
@@ -130,31 +233,33 @@ class StateManager:
     
     def clear_current_playback(self):
         with self._lock:
+            self._full_state_cache = None
             self._current_source_type = None
             self._current_playing_file = None
             self._current_video_start_time = None
+            self._current_video_started_at = None
             self._current_video_duration = None
     
     def get_current_playback(self) -> Dict[str, Any]:
         with self._lock:
             elapsed_time = 0
-            if self._current_video_start_time:
-                elapsed_time = time.time() - self._current_video_start_time
+            if self._current_video_start_time is not None:
+                elapsed_time = time.monotonic() - self._current_video_start_time
             
             return {
                 'source_type': self._current_source_type,
                 'playing_file': self._current_playing_file,
                 'elapsed_time': elapsed_time,
                 'duration': self._current_video_duration,
-                'start_time': self._current_video_start_time
+                'start_time': self._current_video_started_at
             }
     
     def get_current_timestamp(self) -> float:
         """Get current timestamp in the playing video"""
-        with self._lock:
-            if self._current_video_start_time:
-                return time.time() - self._current_video_start_time
-            return 0.0
+        start_time = self._current_video_start_time
+        if start_time is not None:
+            return time.monotonic() - start_time
+        return 0.0
     
     # --- Process Management ---
     
@@ -174,157 +279,426 @@ class StateManager:
     
     def increment_segment_count(self):
         with self._lock:
+            self._full_state_cache = None
             self._total_segments_created += 1
     
     def get_statistics(self) -> Dict[str, Any]:
         with self._lock:
             uptime = 0
-            if self._stream_start_time:
-                uptime = time.time() - self._stream_start_time
+            if self._stream_start_time is not None:
+                uptime = time.monotonic() - self._stream_start_time
             
             return {
                 'total_videos_played': self._total_videos_played,
                 'total_segments_created': self._total_segments_created,
-                'queue_length': len(self._playlist_queue)
+                'queue_length': len(self._queue_snapshot),
+                'uptime': uptime
             }
     
     # --- Full State Export ---
     
     def get_full_state(self) -> Dict[str, Any]:
-        """Get complete state for API responses"""
+        """
+        Get complete state for API responses
+        Polled by every open dashboard, so a result is reused for
+        FULL_STATE_CACHE_TTL seconds unless the state changes (elapsed_time
+        and uptime may lag by up to that much). Treat the returned dict as read-only
+        """
+        cached = self._full_state_cache
+        if cached is not None and time.monotonic() - cached[0] < config.FULL_STATE_CACHE_TTL:
+            return cached[1]
+        
         with self._lock:
-            playback = self.get_current_playback()
-            stats = self.get_statistics()
+            # Built inline rather than via get_current_playback/get_statistics,
+            # which would try to take the (non-reentrant) lock again
+            now = time.monotonic()
+            queue = list(self._queue_snapshot)
+            start_time = self._current_video_start_time
+            stream_start = self._stream_start_time
+            playback = {
+                'source_type': self._current_source_type,
+                'playing_file': self._current_playing_file,
+                'elapsed_time': now - start_time if start_time is not None else 0,
+                'duration': self._current_video_duration,
+                'start_time': self._current_video_started_at
+            }
+            stats = {
+                'total_videos_played': self._total_videos_played,
+                'total_segments_created': self._total_segments_created,
+                'queue_length': len(queue),
+                'uptime': now - stream_start if stream_start is not None else 0
+            }
             
-            return {
+            state = {
                 'is_broadcasting': self._is_broadcasting,
                 'is_live_camera_mode': self._is_live_camera_mode,
-                'queue': self._playlist_queue.copy(),
+                'queue': queue,
                 'current_playback': playback,
                 'statistics': stats,
-                'statistics': stats,
                 'program_name': self._program_name,
                 'auto_mode_enabled': self._auto_mode_enabled,
                 'current_hashtag': self._current_hashtag
             }
+            self._full_state_cache = (time.monotonic(), state)
+            return state
+
+
+class SegmentMeta:
+    """
+    Metadata for one HLS segment
+    A slotted object instead of a dict: thousands of these stay in memory
+    """
+    
+    __slots__ = ('source_video', 'source_type', 'start_time', 'duration', 'created_at', 'status')
+    
+    def __init__(self, source_video: str, source_type: str, start_time: float,
+                 duration: float, created_at: str, status: str = STATUS_ACTIVE):
+        self.source_video = source_video
+        self.source_type = source_type
+        self.start_time = start_time
+        self.duration = duration
+        self.created_at = created_at
+        self.status = status
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SegmentMeta':
+        return cls(
+            data.get('source_video'),
+            data.get('source_type'),
+            data.get('start_time'),
+            data.get('duration'),
+            data.get('created_at', ''),
+            sys.intern(data.get('status', STATUS_ACTIVE))
+        )
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'source_video': self.source_video,
+            'source_type': self.source_type,
+            'start_time': self.start_time,
+            'duration': self.duration,
+            'created_at': self.created_at,
+            'status': self.status
+        }
 
 
 class SegmentTracker:
     """
     Tracks HLS segments and their metadata
     Maps segments to source videos and timestamps
+    
+    On disk the metadata is a snapshot (metadata_file) plus an append-only
+    JSONL log of the changes made since (log_file: "add", "status" and "del"
+    events). Saving a batch only appends its events, whatever the number of
+    segments; the snapshot is rewritten and the log emptied by flush() once
+    the log reaches SEGMENT_LOG_COMPACT_SIZE
     """
     
-    def __init__(self, metadata_file: str):
+    def __init__(self, metadata_file: str, duration_cache_file: str = None, log_file: str = None):
         self._lock = threading.RLock()
+        # Serializes metadata file writes, which happen outside self._lock
+        self._write_lock = threading.Lock()
         self._metadata_file = metadata_file
-        self._segments = {}  # segment_name -> metadata
+        self._log_file = log_file or os.path.splitext(metadata_file)[0] + '.jsonl'
+        self._log_size = 0
+        self._segments = {}  # segment_name -> SegmentMeta
+        # Segment names, oldest first, so the newest ones are found without
+        # sorting every segment by created_at
+        self._insertion_order = deque()
         self._load_metadata()
+        
+        # Changes (new segments, status updates, removals) since the log was
+        # last written, as log events; they are saved in batches, not one by one
+        self._pending_events = []
+        self._unsaved_changes = 0
+        self._last_flush = time.monotonic()
+        
+        # Source video durations, so ffprobe only runs once per file version
+        self._duration_cache_file = duration_cache_file
+        self._duration_cache = {}  # path -> [mtime_ns, size, duration]
+        # Serializes cache file writes, which happen outside self._lock
+        self._duration_save_lock = threading.Lock()
+        self._load_duration_cache()
     
     def _load_metadata(self):
-        """Load existing metadata from file"""
+        """Load existing metadata from the snapshot, then replay the change log"""
         if os.path.exists(self._metadata_file):
             try:
-                with open(self._metadata_file, 'r', encoding='utf-8') as f:
-                    self._segments = json.load(f)
+                with open(self._metadata_file, 'rb') as f:
+                    data = f.read()
+                raw = load_json(data)
+                self._segments = {name: SegmentMeta.from_dict(meta) for name, meta in raw.items()}
             except Exception as e:
-                print(f"Error loading segment metadata: {e}")
+                logger.error("Error loading segment metadata: %s", e)
                 self._segments = {}
+        
+        if os.path.exists(self._log_file):
+            try:
+                with open(self._log_file, 'rb+') as f:
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # Every event is written with its newline in one
+                            # write(), so this is a torn last line from a crash
+                            # mid-append: cut it off so new events don't get
+                            # appended to it
+                            f.truncate(self._log_size)
+                            break
+                        self._log_size += len(line)
+                        try:
+                            event = load_json(line)
+                        except ValueError:
+                            logger.warning("Skipping unreadable line in %s", self._log_file)
+                            continue
+                        self._apply_event(event)
+            except Exception as e:
+                logger.error("Error replaying segment metadata log: %s", e)
+        
+        # One sort at startup; from here on add_segment keeps the order
+        self._insertion_order = deque(
+            sorted(self._segments, key=lambda name: self._segments[name].created_at)
+        )
+        
+        # Segments per status, kept up to date as statuses change
+        self._counts = {STATUS_ACTIVE: 0, STATUS_ARCHIVED: 0, STATUS_DELETED: 0}
+        for meta in self._segments.values():
+            self._count(meta.status, 1)
+    
+    def _apply_event(self, event: Dict[str, Any]):
+        """Apply one change log event to self._segments (while loading)"""
+        op = event.get('op')
+        if op == 'add':
+            self._segments[event['name']] = SegmentMeta.from_dict(event)
+        elif op == 'status':
+            status = sys.intern(event['status'])
+            for name in event['names']:
+                meta = self._segments.get(name)
+                if meta is not None:
+                    meta.status = status
+        elif op == 'del':
+            for name in event['names']:
+                self._segments.pop(name, None)
+    
+    def _count(self, status: str, delta: int):
+        """Adjust the running count for a status (caller holds the lock)"""
+        self._counts[status] = self._counts.get(status, 0) + delta
+    
+    def _mark_dirty(self, changes: int = 1) -> bool:
+        """
+        Record unsaved changes (caller holds the lock)
+        Returns: True once the batch is big or old enough to be written
+        """
+        self._unsaved_changes += changes
+        return (self._unsaved_changes >= config.SEGMENT_FLUSH_BATCH or
+                time.monotonic() - self._last_flush >= config.SEGMENT_FLUSH_INTERVAL)
+    
+    def _save_metadata(self, only_if_dirty: bool = False):
+        """
+        Save the pending changes by appending their events to the log file
+        The events are taken under the state lock; encoding, the write (one
+        write() call) and fsync happen outside it, so segment producers never
+        wait on the disk. Must be called without holding self._lock
+        """
+        with self._write_lock:
+            with self._lock:
+                if only_if_dirty and not self._unsaved_changes:
+                    return
+                events = self._pending_events
+                self._pending_events = []
+                self._unsaved_changes = 0
+                self._last_flush = time.monotonic()
+            
+            if not events:
+                return
+            data = b''.join(dump_json(event) + b'\n' for event in events)
+            try:
+                with open(self._log_file, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._log_size += len(data)
+            except Exception as e:
+                logger.error("Error saving segment metadata: %s", e)
+    
+    def _compact(self):
+        """
+        Rewrite the snapshot from the current state and empty the log
+        The snapshot is written to a temporary file and swapped in, so readers
+        never see a partially written file. A crash before the log is emptied
+        only means its events are replayed over a snapshot that already
+        contains them. Must be called without holding self._lock
+        """
+        with self._write_lock:
+            with self._lock:
+                segments = {name: meta.as_dict() for name, meta in self._segments.items()}
+                # Pending changes are part of the snapshot now
+                self._pending_events = []
+                self._unsaved_changes = 0
+                self._last_flush = time.monotonic()
+            
+            data = dump_json(segments, indent=True)
+            try:
+                temp_file = self._metadata_file + '.tmp'
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self._metadata_file)
+                open(self._log_file, 'wb').close()
+                self._log_size = 0
+            except Exception as e:
+                logger.error("Error compacting segment metadata: %s", e)
     
-    def _save_metadata(self):
-        """Save metadata to file"""
-        try:
-            with open(self._metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self._segments, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving segment metadata: {e}")
+    def flush(self):
+        """Write out any changes made since the last save, compacting the log if it's grown too big"""
+        self._save_metadata(only_if_dirty=True)
+        if self._log_size >= config.SEGMENT_LOG_COMPACT_SIZE:
+            self._compact()
+    
+    def _load_duration_cache(self):
+        """Load cached video durations from file"""
+        if self._duration_cache_file and os.path.exists(self._duration_cache_file):
+            try:
+                with open(self._duration_cache_file, 'r', encoding='utf-8') as f:
+                    self._duration_cache = json.load(f)
+            except Exception as e:
+                logger.error("Error loading duration cache: %s", e)
+                self._duration_cache = {}
+    
+    def _save_duration_cache(self):
+        """Save cached video durations to file (call without holding self._lock)"""
+        if not self._duration_cache_file:
+            return
+        with self._duration_save_lock:
+            # Copied inside the save lock so an older copy never overwrites a newer one
+            with self._lock:
+                cache = dict(self._duration_cache)
+            try:
+                temp_file = self._duration_cache_file + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=2, ensure_ascii=False)
+                os.replace(temp_file, self._duration_cache_file)
+            except Exception as e:
+                logger.error("Error saving duration cache: %s", e)
+    
+    def get_cached_duration(self, path: str, mtime_ns: int, size: int) -> Optional[float]:
+        """Get the cached duration of a video, if the file hasn't changed since"""
+        with self._lock:
+            entry = self._duration_cache.get(path)
+            if entry and entry[0] == mtime_ns and entry[1] == size:
+                return entry[2]
+            return None
+    
+    def cache_duration(self, path: str, mtime_ns: int, size: int, duration: float):
+        """Remember the duration of a video (replaces any older entry for the path)"""
+        with self._lock:
+            self._duration_cache[path] = [mtime_ns, size, duration]
+        self._save_duration_cache()
     
     def add_segment(self, segment_name: str, source_video: str, source_type: str, 
                    start_time: float, duration: float):
         """Add a new segment with metadata"""
         with self._lock:
-            self._segments[segment_name] = {
-                'source_video': source_video,
-                'source_type': source_type,
-                'start_time': start_time,
-                'duration': duration,
-                'created_at': datetime.now().isoformat(),
-                'status': 'active'
-            }
-            self._save_metadata()
+            old = self._segments.get(segment_name)
+            if old is not None:
+                # Name reused (e.g. numbering restarted): it's the newest now
+                self._insertion_order.remove(segment_name)
+                self._count(old.status, -1)
+            self._count(STATUS_ACTIVE, 1)
+            self._insertion_order.append(segment_name)
+            meta = SegmentMeta(
+                source_video, source_type, start_time, duration,
+                datetime.now().isoformat()
+            )
+            self._segments[segment_name] = meta
+            self._pending_events.append({'op': 'add', 'name': segment_name, **meta.as_dict()})
             
-            if config.DEBUG_SEGMENT_TRACKING:
-                print(f"Tracked segment: {segment_name} from {source_video} at {start_time:.2f}s")
+            # Batch writes: a new segment arrives every couple of seconds
+            save = self._mark_dirty()
+        
+        if save:
+            self._save_metadata()
+        
+        if config.DEBUG_SEGMENT_TRACKING:
+            logger.info("Tracked segment: %s from %s at %.2fs", segment_name, source_video, start_time)
     
     def update_segment_status(self, segment_name: str, status: str):
         """Update segment status (active, archived, deleted)"""
+        self.update_segments_status((segment_name,), status)
+    
+    def update_segments_status(self, segment_names: Iterable[str], status: str):
+        """Update the status of several segments as one change to the metadata file"""
         with self._lock:
-            if segment_name in self._segments:
-                self._segments[segment_name]['status'] = status
-                self._save_metadata()
+            updated = []
+            for segment_name in segment_names:
+                meta = self._segments.get(segment_name)
+                if meta is None:
+                    continue
+                self._count(meta.status, -1)
+                self._count(status, 1)
+                meta.status = status
+                updated.append(segment_name)
+            if updated:
+                self._pending_events.append({'op': 'status', 'names': updated, 'status': status})
+            save = bool(updated) and self._mark_dirty(len(updated))
+        
+        if save:
+            self._save_metadata()
     
     def get_segment_info(self, segment_name: str) -> Optional[Dict[str, Any]]:
         """Get metadata for a specific segment"""
         with self._lock:
-            return self._segments.get(segment_name)
+            meta = self._segments.get(segment_name)
+            return meta.as_dict() if meta is not None else None
     
     def get_current_segment(self) -> Optional[Dict[str, Any]]:
         """Get the most recently created active segment"""
         with self._lock:
-            active_segments = [
-                (name, meta) for name, meta in self._segments.items()
-                if meta['status'] == 'active'
-            ]
-            
-            if active_segments:
-                # Sort by creation time and get the latest
-                active_segments.sort(key=lambda x: x[1]['created_at'], reverse=True)
-                name, meta = active_segments[0]
-                return {'segment_name': name, **meta}
+            # Newest first; usually the very first one is still active
+            for name in reversed(self._insertion_order):
+                meta = self._segments[name]
+                if meta.status == STATUS_ACTIVE:
+                    return {'segment_name': name, **meta.as_dict()}
             
             return None
     
     def get_segment_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get recent segment history"""
         with self._lock:
-            segments = [
-                {'segment_name': name, **meta}
-                for name, meta in self._segments.items()
+            # Newest first, stopping after `limit` segments
+            return [
+                {'segment_name': name, **self._segments[name].as_dict()}
+                for name in islice(reversed(self._insertion_order), max(limit, 0))
             ]
-            
-            # Sort by creation time (newest first)
-            segments.sort(key=lambda x: x['created_at'], reverse=True)
-            
-            return segments[:limit]
     
     def cleanup_deleted_segments(self):
         """Remove metadata for deleted segments"""
         with self._lock:
             deleted = [
                 name for name, meta in self._segments.items()
-                if meta['status'] == 'deleted'
+                if meta.status == STATUS_DELETED
             ]
             
             for name in deleted:
                 del self._segments[name]
-            
+            self._count(STATUS_DELETED, -len(deleted))
             if deleted:
-                self._save_metadata()
-                print(f"Cleaned up metadata for {len(deleted)} deleted segments")
+                self._insertion_order = deque(
+                    name for name in self._insertion_order if name in self._segments
+                )
+                self._pending_events.append({'op': 'del', 'names': deleted})
+            save = bool(deleted) and self._mark_dirty(len(deleted))
+        
+        if save:
+            self._save_metadata()
+        if deleted:
+            logger.info("Cleaned up metadata for %d deleted segments", len(deleted))
     
     def get_stats(self) -> Dict[str, int]:
         """Get segment statistics"""
         with self._lock:
-            stats = {
+            return {
                 'total': len(self._segments),
-                'active': 0,
-                'archived': 0,
-                'deleted': 0
+                'active': self._counts[STATUS_ACTIVE],
+                'archived': self._counts[STATUS_ARCHIVED],
+                'deleted': self._counts[STATUS_DELETED]
             }
-            
-            for meta in self._segments.values():
-                status = meta.get('status', 'active')
-                if status in stats:
-                    stats[status] += 1
-            
-            return stats
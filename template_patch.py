@@ -0,0 +1,69 @@
+"""
+Shared helpers for the index.html patch scripts (add_overlay_ui.py,
+add_program_ui.py, patch_index.py): read the template, look for the
+sentinels of already-inserted blocks, splice blocks in front of markers
+"""
+
+import os
+import re
+
+# 1 MB I/O buffer so the template is written in one or two syscalls instead
+# of io.DEFAULT_BUFFER_SIZE (8 KB) chunks
+IO_BUFFER_SIZE = 1 << 20
+
+
+def read_template(path: str) -> bytearray:
+    """Read the file straight into a bytearray (one read, no str decode)"""
+    with open(path, 'rb', buffering=0) as f:
+        content = bytearray(os.fstat(f.fileno()).st_size)
+        f.readinto(content)
+    return content
+
+
+def write_template(path: str, content):
+    """Write the patched template back"""
+    with open(path, 'wb', buffering=IO_BUFFER_SIZE) as f:
+        f.write(content)
+
+
+def find_sentinels(data, sentinels) -> list:
+    """Return the sentinels (strings only inserted blocks contain) present in `data`"""
+    return [sentinel for sentinel in sentinels if data.find(sentinel) != -1]
+
+
+def find_markers(data, markers) -> dict:
+    """
+    Locate the first occurrence of each marker in a single regex walk
+    Returns: {marker: offset} for the markers that were found
+    """
+    pattern = re.compile(b'|'.join(re.escape(marker) for marker in markers))
+
+    offsets = {}
+    for match in pattern.finditer(data):
+        offsets.setdefault(match.group(0), match.start())
+        if len(offsets) == len(markers):
+            break
+    return offsets
+
+
+def splice_at(buf: bytearray, offsets: dict, blocks: dict):
+    """
+    Insert blocks[marker] at each known marker offset, in place
+    Works back to front so earlier offsets stay valid; each insertion only
+    moves the tail of the buffer instead of copying the whole template
+    """
+    for marker, offset in sorted(offsets.items(), key=lambda item: item[1], reverse=True):
+        buf[offset:offset] = blocks[marker]
+
+
+def splice_all(buf: bytearray, splices) -> dict:
+    """
+    Insert each block in front of the first occurrence of its marker
+    `splices` is a list of (marker, block) pairs; `buf` is walked once and
+    patched in place
+    Returns: {marker: offset} for the markers found
+    """
+    blocks = dict(splices)
+    offsets = find_markers(buf, list(blocks))
+    splice_at(buf, offsets, blocks)
+    return offsets
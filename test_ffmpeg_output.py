@@ -0,0 +1,37 @@
+"""Check the FFmpeg output arguments (stream mapping, HLS and tee/DASH muxers)"""
+import config
+import ffmpeg_output
+
+
+def test_dash_without_overlay_maps_streams_before_tee():
+    # No overlay filter: the input streams are mapped directly
+    args = ffmpeg_output.build_output_args('0:v', '0:a?', ffmpeg_output.build_muxer_args(True))
+
+    tee_at = args.index('tee') - 1
+    assert args[tee_at] == '-f'
+    assert args[:4] == ('-map', '0:v', '-map', '0:a?')
+    assert tee_at > 3
+
+    outputs = args[tee_at + 2]
+    assert outputs.startswith('[f=hls:')
+    assert '|[f=dash:' in outputs
+    assert outputs.endswith('stream.mpd')
+    assert '+global_header' in args[args.index('-flags') + 1]
+
+
+def test_overlay_label_is_mapped():
+    args = ffmpeg_output.build_output_args('[out]', '0:a?', ffmpeg_output.build_muxer_args(True))
+    assert args[:4] == ('-map', '[out]', '-map', '0:a?')
+
+
+def test_hls_only_output():
+    args = ffmpeg_output.build_output_args('0:v', '1:a', ffmpeg_output.build_muxer_args(False))
+    assert args[:4] == ('-map', '0:v', '-map', '1:a')
+    assert args[args.index('-f') + 1] == 'hls'
+    assert args[-1] == config.HLS_PLAYLIST
+    assert 'tee' not in args
+
+
+def test_tee_escape():
+    assert ffmpeg_output.tee_escape("a:b]c", ffmpeg_output.TEE_OPTION_SPECIALS) == "a\\:b\\]c"
+    assert ffmpeg_output.tee_output([('f', 'hls')], 'x|y') == "[f=hls]x\\|y"
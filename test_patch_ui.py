@@ -0,0 +1,98 @@
+"""Check that the index.html patch scripts are idempotent"""
+import pytest
+
+import add_overlay_ui
+import add_program_ui
+import patch_index
+
+# Minimal template with both insertion points
+TEMPLATE = (
+    b'<html><body>\n'
+    b'                <!-- Queue -->\n'
+    b'    <script>\n'
+    b'        console.log("dashboard");\n'
+    b'    </script>\n'
+    b'</body></html>\n'
+)
+
+# Same, without the Queue marker (like templates/index.html)
+TEMPLATE_NO_QUEUE = TEMPLATE.replace(b'                <!-- Queue -->\n', b'')
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / 'index.html'
+    path.write_bytes(TEMPLATE)
+    return path
+
+
+@pytest.fixture
+def run_patch_index(tmp_path, monkeypatch):
+    """Run patch_index.main against a template in tmp_path, with its own state file"""
+    monkeypatch.setattr(patch_index, 'STATE_PATH', tmp_path / 'state.json')
+
+    def run(path, *args):
+        monkeypatch.setattr(patch_index, 'TEMPLATE_PATH', str(path))
+        return patch_index.main(list(args))
+    return run
+
+
+def test_scripts_patch_once(template):
+    assert add_overlay_ui.patch_overlay(str(template)) is True
+    assert add_program_ui.patch_program(str(template)) is True
+    once = template.read_bytes()
+
+    assert add_overlay_ui.patch_overlay(str(template)) is False
+    assert add_program_ui.patch_program(str(template)) is False
+    assert template.read_bytes() == once
+    assert once.count(b'function bindUpload(') == 1
+    assert once.count(b'function updateProgramName(') == 1
+
+
+def test_patch_index_patches_once(template, run_patch_index, tmp_path):
+    assert run_patch_index(template) == 0
+    once = template.read_bytes()
+
+    # Once with the state file, once without (sentinel scan)
+    assert run_patch_index(template) == 0
+    (tmp_path / 'state.json').unlink()
+    assert run_patch_index(template) == 0
+    assert template.read_bytes() == once
+
+    # Same result as the two separate scripts
+    separate = tmp_path / 'separate.html'
+    separate.write_bytes(TEMPLATE)
+    add_overlay_ui.patch_overlay(str(separate))
+    add_program_ui.patch_program(str(separate))
+    assert separate.read_bytes() == once
+
+
+def test_check_mode(template, run_patch_index, tmp_path, capsys):
+    # Unpatched: reports the diff, exits 1, writes nothing
+    assert run_patch_index(template, '--check') == 1
+    assert template.read_bytes() == TEMPLATE
+    assert '(patched)' in capsys.readouterr().out
+
+    # Patched: exits 0, still writes nothing
+    assert run_patch_index(template) == 0
+    patched = template.read_bytes()
+    assert run_patch_index(template, '--check') == 0
+    (tmp_path / 'state.json').unlink()
+    assert run_patch_index(template, '--check') == 0
+    assert template.read_bytes() == patched
+    assert not (tmp_path / 'state.json').exists()
+
+
+def test_missing_marker_leaves_template_alone(tmp_path, run_patch_index):
+    path = tmp_path / 'index.html'
+    path.write_bytes(TEMPLATE_NO_QUEUE)
+
+    for patch in (add_overlay_ui.patch_overlay, add_program_ui.patch_program):
+        with pytest.raises(ValueError):
+            patch(str(path))
+    assert path.read_bytes() == TEMPLATE_NO_QUEUE
+
+    assert run_patch_index(path) == 1
+    assert run_patch_index(path, '--check') == 1
+    assert run_patch_index(path) == 1
+    assert path.read_bytes() == TEMPLATE_NO_QUEUE
@@ -3,13 +3,19 @@ Trash Bin Manager Module
 Handles automatic cleanup of old HLS segments
 """
 
+import errno
+import logging
 import os
 import time
 import threading
 import shutil
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Tuple
 from datetime import datetime
 import config
+from state_manager import STATUS_ARCHIVED, STATUS_DELETED
+
+logger = logging.getLogger(__name__)
 
 
 class TrashBinManager:
@@ -27,87 +33,162 @@ class TrashBinManager:
         # Ensure trash directory exists
         os.makedirs(self._trash_dir, exist_ok=True)
         
-        # Track when segments were moved to trash
-        self._trash_timestamps = {}  # filename -> timestamp
+        # Track when segments were moved to trash, and their size
+        self._trash_timestamps = {}  # filename -> (timestamp, size_bytes)
+        # (timestamp, filename) in the order segments were trashed, i.e. oldest
+        # first, so expiry only looks at the segments that are due. Entries of
+        # segments deleted since (timestamp no longer matches) are skipped
+        self._trash_order = deque()
+        
+        # Running total of the trash size, so get_stats doesn't stat every file.
+        # Seeded once with whatever is already in the trash directory
+        self._total_trash_bytes = 0
+        for entry in self._get_trash_entries():
+            try:
+                self._total_trash_bytes += entry.stat().st_size
+            except OSError:
+                pass
+        
+        # Wakes the cleanup thread when a new segment is written (see
+        # notify_new_segment) or when it's asked to stop
+        self._work_cv = threading.Condition()
+        self._new_segments = True  # Run one pass at startup
         
         # Start cleanup thread
         self._stop_event = threading.Event()
         self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self._cleanup_thread.start()
     
-    def get_active_segments(self) -> List[str]:
-        """Get list of active segment files in HLS directory"""
-        try:
-            files = [
-                f for f in os.listdir(self._hls_dir)
-                if f.endswith('.ts') and os.path.isfile(os.path.join(self._hls_dir, f))
+    def _scan_segments(self, directory: str) -> List[os.DirEntry]:
+        """
+        List the segment files in a directory
+        scandir entries carry the file type and cache their stat(), so each
+        file costs one syscall at most
+        """
+        with os.scandir(directory) as it:
+            return [
+                entry for entry in it
+                if entry.name.endswith(config.HLS_SEGMENT_EXTENSION) and entry.is_file(follow_symlinks=False)
             ]
+    
+    def get_active_segments(self) -> List[Tuple[str, str]]:
+        """
+        Get active segment files in HLS directory
+        Returns: (name, path) tuples, oldest first
+        """
+        try:
+            entries = self._scan_segments(self._hls_dir)
             # Sort by modification time (oldest first)
-            files.sort(key=lambda f: os.path.getmtime(os.path.join(self._hls_dir, f)))
-            return files
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            return [(entry.name, entry.path) for entry in entries]
         except Exception as e:
-            print(f"Error getting active segments: {e}")
+            logger.error("Error getting active segments: %s", e)
             return []
     
-    def get_trash_segments(self) -> List[str]:
-        """Get list of segments in trash directory"""
+    def _get_trash_entries(self) -> List[os.DirEntry]:
+        """Segment entries in the trash directory (empty if it's missing)"""
         try:
-            if not os.path.exists(self._trash_dir):
-                return []
-            return [
-                f for f in os.listdir(self._trash_dir)
-                if f.endswith('.ts')
-            ]
+            return self._scan_segments(self._trash_dir)
+        except FileNotFoundError:
+            return []
         except Exception as e:
-            print(f"Error getting trash segments: {e}")
+            logger.error("Error getting trash segments: %s", e)
             return []
     
-    def move_to_trash(self, segment_name: str) -> bool:
-        """Move a segment from active directory to trash"""
+    def get_trash_segments(self) -> List[Tuple[str, str]]:
+        """
+        Get segments in trash directory
+        Returns: (name, path) tuples
+        """
+        return [(entry.name, entry.path) for entry in self._get_trash_entries()]
+    
+    def move_to_trash(self, segment_name: str, source_path: str = None,
+                      update_tracker: bool = True) -> bool:
+        """
+        Move a segment from active directory to trash
+        `source_path` can be passed when the caller already has it (e.g. from
+        get_active_segments). A segment that is already gone is not an error.
+        Bulk callers pass update_tracker=False and update the segment tracker
+        once for the whole batch
+        """
         with self._lock:
-            source_path = os.path.join(self._hls_dir, segment_name)
+            if source_path is None:
+                source_path = os.path.join(self._hls_dir, segment_name)
             dest_path = os.path.join(self._trash_dir, segment_name)
             
             try:
-                if os.path.exists(source_path):
+                # A file of the same name already in the trash gets replaced
+                replaced = self._trash_timestamps.get(segment_name)
+                if replaced is not None:
+                    replaced_size = replaced[1]
+                else:
+                    try:
+                        replaced_size = os.path.getsize(dest_path)
+                    except OSError:
+                        replaced_size = 0
+                
+                try:
+                    # Same filesystem (the usual case): a plain rename
+                    os.replace(source_path, dest_path)
+                except FileNotFoundError:
+                    return False
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
                     shutil.move(source_path, dest_path)
-                    self._trash_timestamps[segment_name] = time.time()
-                    
-                    # Update segment tracker
-                    self._segment_tracker.update_segment_status(segment_name, 'archived')
-                    
-                    print(f"Moved to trash: {segment_name}")
-                    return True
+                size = os.path.getsize(dest_path)
+                trash_time = time.time()
+                self._trash_timestamps[segment_name] = (trash_time, size)
+                self._trash_order.append((trash_time, segment_name))
+                self._total_trash_bytes += size - replaced_size
+                
+                # Update segment tracker
+                if update_tracker:
+                    self._segment_tracker.update_segment_status(segment_name, STATUS_ARCHIVED)
+                
+                logger.debug("Moved to trash: %s", segment_name)
+                return True
             except Exception as e:
-                print(f"Error moving {segment_name} to trash: {e}")
+                logger.error("Error moving %s to trash: %s", segment_name, e)
             
             return False
     
-    def delete_permanently(self, segment_name: str) -> bool:
-        """Permanently delete a segment from trash"""
+    def delete_permanently(self, segment_name: str, trash_path: str = None,
+                           update_tracker: bool = True) -> bool:
+        """
+        Permanently delete a segment from trash
+        A segment that is already gone is not an error. See move_to_trash for
+        update_tracker
+        """
         with self._lock:
-            trash_path = os.path.join(self._trash_dir, segment_name)
+            if trash_path is None:
+                trash_path = os.path.join(self._trash_dir, segment_name)
             
             try:
-                if os.path.exists(trash_path):
-                    os.remove(trash_path)
-                    
-                    # Remove from trash timestamps
-                    if segment_name in self._trash_timestamps:
-                        del self._trash_timestamps[segment_name]
-                    
-                    # Update segment tracker
-                    self._segment_tracker.update_segment_status(segment_name, 'deleted')
-                    
-                    print(f"Permanently deleted: {segment_name}")
-                    return True
+                entry = self._trash_timestamps.get(segment_name)
+                size = entry[1] if entry is not None else os.path.getsize(trash_path)
+                os.remove(trash_path)
+                self._total_trash_bytes -= size
+                
+                # Remove from trash timestamps (its _trash_order entry goes stale)
+                self._trash_timestamps.pop(segment_name, None)
+                
+                # Update segment tracker
+                if update_tracker:
+                    self._segment_tracker.update_segment_status(segment_name, STATUS_DELETED)
+                
+                logger.debug("Permanently deleted: %s", segment_name)
+                return True
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                print(f"Error deleting {segment_name}: {e}")
+                logger.error("Error deleting %s: %s", segment_name, e)
             
             return False
     
     def cleanup_old_segments(self):
         """Move old active segments to trash if exceeding MAX_ACTIVE_SEGMENTS"""
+        moved = []
         with self._lock:
             active_segments = self.get_active_segments()
             
@@ -115,11 +196,15 @@ class TrashBinManager:
                 # Move oldest segments to trash
                 segments_to_move = active_segments[:len(active_segments) - config.MAX_ACTIVE_SEGMENTS]
                 
-                for segment in segments_to_move:
-                    self.move_to_trash(segment)
-                
-                if segments_to_move:
-                    print(f"Moved {len(segments_to_move)} old segments to trash")
+                moved = [
+                    segment for segment, path in segments_to_move
+                    if self.move_to_trash(segment, path, update_tracker=False)
+                ]
+        
+        if moved:
+            # One metadata update for the whole batch
+            self._segment_tracker.update_segments_status(moved, STATUS_ARCHIVED)
+            logger.info("Moved %d old segments to trash", len(moved))
     
     def cleanup_trash(self):
         """Permanently delete segments from trash that exceeded retention time"""
@@ -127,38 +212,73 @@ class TrashBinManager:
             current_time = time.time()
             segments_to_delete = []
             
-            for segment_name, trash_time in list(self._trash_timestamps.items()):
-                if current_time - trash_time > config.TRASH_RETENTION_TIME:
+            while self._trash_order and current_time - self._trash_order[0][0] > config.TRASH_RETENTION_TIME:
+                trash_time, segment_name = self._trash_order.popleft()
+                entry = self._trash_timestamps.get(segment_name)
+                if entry is not None and entry[0] == trash_time:
                     segments_to_delete.append(segment_name)
             
-            for segment in segments_to_delete:
-                self.delete_permanently(segment)
+            deleted = [
+                segment for segment in segments_to_delete
+                if self.delete_permanently(segment, update_tracker=False)
+            ]
+        
+        if deleted:
+            self._segment_tracker.update_segments_status(deleted, STATUS_DELETED)
+            logger.info("Permanently deleted %d segments from trash", len(deleted))
             
-            if segments_to_delete:
-                print(f"Permanently deleted {len(segments_to_delete)} segments from trash")
-                
-                # Cleanup metadata for deleted segments
-                self._segment_tracker.cleanup_deleted_segments()
+            # Cleanup metadata for deleted segments
+            self._segment_tracker.cleanup_deleted_segments()
+    
+    def notify_new_segment(self):
+        """Tell the cleanup thread a segment was added to the HLS directory"""
+        with self._work_cv:
+            self._new_segments = True
+            self._work_cv.notify()
+    
+    def _next_expiry_timeout(self):
+        """Seconds until the oldest trashed segment expires, or None if the trash is empty"""
+        with self._lock:
+            if not self._trash_order:
+                return None
+            oldest_time = self._trash_order[0][0]
+        return max(0, oldest_time + config.TRASH_RETENTION_TIME - time.time())
     
     def _cleanup_loop(self):
-        """Background thread for periodic cleanup"""
+        """
+        Background thread for cleanup
+        Sleeps until a new segment arrives (the active count may now be over
+        the limit) or the oldest trashed segment is due, never on a timer
+        """
         while not self._stop_event.is_set():
+            with self._work_cv:
+                has_new_segments = self._new_segments
+                self._new_segments = False
+            
             try:
                 # Cleanup old active segments
-                self.cleanup_old_segments()
+                if has_new_segments:
+                    self.cleanup_old_segments()
                 
                 # Cleanup trash
                 self.cleanup_trash()
                 
             except Exception as e:
-                print(f"Error in cleanup loop: {e}")
+                logger.error("Error in cleanup loop: %s", e)
             
-            # Wait before next cleanup check
-            self._stop_event.wait(config.CLEANUP_CHECK_INTERVAL)
+            # Wait for the next new segment or expiry
+            timeout = self._next_expiry_timeout()
+            with self._work_cv:
+                self._work_cv.wait_for(
+                    lambda: self._new_segments or self._stop_event.is_set(),
+                    timeout
+                )
     
     def stop(self):
         """Stop the cleanup thread"""
         self._stop_event.set()
+        with self._work_cv:
+            self._work_cv.notify()
         if self._cleanup_thread.is_alive():
             self._cleanup_thread.join(timeout=2)
     
@@ -168,16 +288,7 @@ class TrashBinManager:
             active_segments = self.get_active_segments()
             trash_segments = self.get_trash_segments()
             
-            # Calculate trash size
-            trash_size_bytes = 0
-            for segment in trash_segments:
-                try:
-                    trash_path = os.path.join(self._trash_dir, segment)
-                    trash_size_bytes += os.path.getsize(trash_path)
-                except:
-                    pass
-            
-            trash_size_mb = trash_size_bytes / (1024 * 1024)
+            trash_size_mb = self._total_trash_bytes / (1024 * 1024)
             
             return {
                 'active_segments': len(active_segments),
@@ -192,12 +303,18 @@ class TrashBinManager:
         with self._lock:
             # Move all active segments to trash
             active_segments = self.get_active_segments()
-            for segment in active_segments:
-                self.move_to_trash(segment)
+            moved = [
+                segment for segment, path in active_segments
+                if self.move_to_trash(segment, path, update_tracker=False)
+            ]
             
             # Delete all trash segments
             trash_segments = self.get_trash_segments()
-            for segment in trash_segments:
-                self.delete_permanently(segment)
-            
-            print(f"Force cleanup: moved {len(active_segments)} to trash, deleted {len(trash_segments)}")
+            deleted = [
+                segment for segment, path in trash_segments
+                if self.delete_permanently(segment, path, update_tracker=False)
+            ]
+        
+        self._segment_tracker.update_segments_status(moved, STATUS_ARCHIVED)
+        self._segment_tracker.update_segments_status(deleted, STATUS_DELETED)
+        logger.info("Force cleanup: moved %d to trash, deleted %d", len(active_segments), len(trash_segments))